@@ -0,0 +1,20 @@
+"""
+ASGI config for app project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Django 2.2 has no native ASGI handler, so the WSGI
+application is adapted with asgiref and each request runs in a thread.
+
+Serve it with uvicorn's gunicorn worker, ``GUNICORN_WORKER_CLASS=
+uvicorn.workers.UvicornH11Worker gunicorn -c gunicorn.conf.py
+app.asgi:application``.
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+application = WsgiToAsgi(get_wsgi_application())
@@ -22,10 +22,14 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = "v8juo7-4v#zq#ugxgtotg+1z%agyg&#guvl(00u1o8616@ky(e"
 
+# Production deployments set DJANGO_ENV=production, core.checks then
+# refuses to start with DEBUG on
+PRODUCTION = os.environ.get("DJANGO_ENV") == "production"
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DJANGO_DEBUG", "0" if PRODUCTION else "1") == "1"
 
-ALLOWED_HOSTS = ["192.168.99.100"]
+ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "192.168.99.100").split(",")
 
 
 # Application definition
@@ -37,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "core",
@@ -45,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -78,16 +85,94 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 switches to the core.backends.pooled backend: each
+# process keeps up to that many connections shared by its threads, and
+# connections go back to the pool at the end of every request.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 0))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": (
+            "core.backends.pooled"
+            if DB_POOL_SIZE
+            else "django.db.backends.postgresql"
+        ),
         "NAME": os.environ.get("DB_NAME"),
         "HOST": os.environ.get("DB_HOST"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        # persistent connections, seconds
+        "CONN_MAX_AGE": (
+            0 if DB_POOL_SIZE else int(os.environ.get("DB_CONN_MAX_AGE", 60))
+        ),
+        "POOL": {
+            "max_size": DB_POOL_SIZE,
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+        },
     }
 }
 
+# Read replicas, comma separated hosts sharing the default credentials.
+# Tests mirror them to the default database.
+REPLICA_DATABASES = []
+for index, host in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))
+):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
+# Seconds a user's reads stay on the primary after a write, covers the
+# replication lag
+READ_YOUR_WRITES_WINDOW = int(os.environ.get("READ_YOUR_WRITES_WINDOW", 5))
+
+# Connections idle for longer are tested with a query before reuse
+DB_HEALTH_CHECK_AFTER = int(os.environ.get("DB_HEALTH_CHECK_AFTER", 30))
+
+
+# Cached list responses, data versions and read-your-writes pins must be
+# seen by every worker process, CACHE_LOCATION points at memcached
+# (host:port, comma separated). The in-process cache is only for tests
+# and development, core.E002 fails a production start without it.
+if os.environ.get("CACHE_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": os.environ.get(
+                "CACHE_BACKEND",
+                "django.core.cache.backends.memcached.MemcachedCache",
+            ),
+            "LOCATION": os.environ["CACHE_LOCATION"].split(","),
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+
+# New and rehashed passwords use PASSWORD_HASHER, the other hashers stay
+# listed so existing hashes still verify and get upgraded on login
+PASSWORD_HASHER_CHOICES = {
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "argon2")
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CHOICES[PASSWORD_HASHER],
+    *(
+        hasher
+        for name, hasher in PASSWORD_HASHER_CHOICES.items()
+        if name != PASSWORD_HASHER
+    ),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -129,3 +214,50 @@ MEDIA_ROOT = "/vol/web/media/"
 STATIC_ROOT = "/vol/web/static/"
 
 AUTH_USER_MODEL = "core.UserModel"
+
+# Lifetime of core.models.AuthToken, in seconds. Tokens expire after
+# idle_timeout without use or max_age after login, whichever comes first.
+AUTH_TOKEN = {
+    "idle_timeout": int(
+        os.environ.get("AUTH_TOKEN_IDLE_TIMEOUT", 14 * 24 * 3600)
+    ),
+    "max_age": int(os.environ.get("AUTH_TOKEN_MAX_AGE", 90 * 24 * 3600)),
+    "touch_interval": int(os.environ.get("AUTH_TOKEN_TOUCH_INTERVAL", 300)),
+}
+
+# Delta sync of recipe.sync, positions stay commit_window seconds behind
+# the newest change so late committing writes are not skipped
+SYNC = {
+    "page_size": int(os.environ.get("SYNC_PAGE_SIZE", 500)),
+    "max_page_size": int(os.environ.get("SYNC_MAX_PAGE_SIZE", 2000)),
+    "commit_window": int(os.environ.get("SYNC_COMMIT_WINDOW", 5)),
+}
+
+# Token -> user resolution cache of core.authentication
+TOKEN_AUTH_CACHE = {
+    "max_size": int(os.environ.get("TOKEN_CACHE_SIZE", 10000)),
+    "ttl": int(os.environ.get("TOKEN_CACHE_TTL", 60)),
+    # django cache alias shared by workers, in-process only when unset
+    "shared_cache": os.environ.get("TOKEN_CACHE_ALIAS"),
+}
+
+# Concurrent password checks per process, see core.authentication
+CREDENTIAL_CHECKS = {
+    "max_concurrent": int(os.environ.get("CREDENTIAL_CHECKS_MAX", 2)),
+    "timeout": float(os.environ.get("CREDENTIAL_CHECKS_TIMEOUT", 5)),
+}
+
+# Per-user versioned list responses of recipe.mixins.CachedListMixin
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Bearer token required by the /metrics endpoint, denied when unset
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Directory where each worker process writes its metrics, so /metrics
+# reports all of them. Only this process is reported when unset.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+
+# In-process worker pool of core.tasks, used for image renditions
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 2))
+BACKGROUND_TASKS_ASYNC = True
@@ -31,3 +31,4 @@ admin.site.register(models.UserModel, UserAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
 admin.site.register(models.Recipe)
+admin.site.register(models.AuthToken)
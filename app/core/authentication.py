@@ -0,0 +1,166 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException, AuthenticationFailed
+
+from core.models import AuthToken
+
+
+class LRUCache:
+    """ Thread-safe bounded mapping with least-recently-used eviction
+    and a time to live for every entry """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TokenCache:
+    """ Token key -> (user, token) cache
+
+    Lookups go to the in-process LRU first and then, when configured, to
+    a shared django cache so other workers benefit from the same entry.
+    Invalidation deletes from both, processes that do not share a cache
+    drop stale entries when their TTL runs out.
+    """
+
+    key_prefix = "auth-token:"
+
+    def __init__(self, max_size=10000, ttl=60, shared_cache=None):
+        self.local = LRUCache(max_size, ttl)
+        self.ttl = ttl
+        self.shared_alias = shared_cache
+
+    @property
+    def shared(self):
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(self.key_prefix + key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, value, self.ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    def delete_user(self, user_id):
+        """ Drops cached entries of all tokens of the user """
+        keys = AuthToken.objects.filter(user_id=user_id).values_list(
+            "key", flat=True
+        )
+        for key in keys:
+            self.delete(key)
+
+
+token_cache = TokenCache(**getattr(settings, "TOKEN_AUTH_CACHE", {}))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ Token authentication that caches token -> user resolution and
+    enforces the sliding expiry of AuthToken """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        cached = credentials is not None
+        if not cached:
+            credentials = super().authenticate_credentials(key)
+        user, token = credentials
+        now = timezone.now()
+        if token.is_expired(now):
+            token_cache.delete(key)
+            raise AuthenticationFailed(_("Token has expired."))
+        # touch() refreshes last_used of the instance, cache it again so
+        # later requests see the extended lifetime
+        if token.touch(now) or not cached:
+            token_cache.set(key, credentials)
+        # requests may change their user, never hand out cached instances
+        return copy.deepcopy(credentials)
+
+
+class CredentialChecksBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many logins in progress, try again shortly.")
+    default_code = "credential_checks_busy"
+
+
+class ConcurrencyLimiter:
+    """ Caps the number of threads running a CPU heavy section at once
+
+    Password hashing is deliberately slow, so a burst of logins would
+    otherwise occupy every worker thread. Callers wait up to ``timeout``
+    seconds for a free slot and get a 503 after that.
+    """
+
+    def __init__(self, max_concurrent=2, timeout=5):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise CredentialChecksBusy()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+credential_limiter = ConcurrencyLimiter(
+    **getattr(settings, "CREDENTIAL_CHECKS", {})
+)
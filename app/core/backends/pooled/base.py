@@ -0,0 +1,193 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from core.metrics import Counter, Gauge, Histogram, registry
+
+
+Database = base.Database
+
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_connections():
+    stats = {}
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        idle, in_use = pool.stats()
+        for state, count in (("idle", idle), ("in_use", in_use)):
+            key = (pool.alias, state)
+            stats[key] = stats.get(key, 0) + count
+    return stats
+
+
+POOL_CONNECTIONS = registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Open pooled connections by state",
+        ("alias", "state"),
+        pool_connections,
+    )
+)
+POOL_WAIT = registry.register(
+    Histogram(
+        "db_pool_wait_seconds",
+        "Time spent waiting for a pooled connection",
+        ("alias",),
+        buckets=POOL_WAIT_BUCKETS,
+    )
+)
+POOL_TIMEOUTS = registry.register(
+    Counter(
+        "db_pool_timeouts_total",
+        "Connection requests that gave up waiting for the pool",
+        ("alias",),
+    )
+)
+
+
+class ConnectionPool:
+    """ Bounded set of open psycopg2 connections shared by the threads of
+    a process
+
+    Connections come back rolled back to an idle state. Ones that sat in
+    the pool longer than ``health_check_after`` seconds are tested with a
+    query before they are handed out again.
+    """
+
+    def __init__(
+        self, connect, alias, max_size=10, timeout=5, health_check_after=30
+    ):
+        self.connect = connect
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def stats(self):
+        with self._cond:
+            return len(self._idle), self._size - len(self._idle)
+
+    def get(self):
+        start = time.monotonic()
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    POOL_TIMEOUTS.inc(self.alias)
+                    raise Database.OperationalError(
+                        f"No pooled connection free after {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+            if self._idle:
+                returned_at, connection = self._idle.pop()
+            else:
+                returned_at, connection = None, None
+                self._size += 1
+        POOL_WAIT.observe(time.monotonic() - start, self.alias)
+
+        if connection is not None and not self.is_healthy(
+            connection, returned_at
+        ):
+            self.close_quietly(connection)
+            connection = None
+        if connection is None:
+            # the slot is already taken, give it back if connecting fails
+            try:
+                connection = self.connect()
+            except Exception:
+                self.release_slot()
+                raise
+        return connection
+
+    def put(self, connection):
+        usable = not connection.closed
+        if usable:
+            try:
+                if connection.get_transaction_status() != (
+                    TRANSACTION_STATUS_IDLE
+                ):
+                    connection.rollback()
+            except Database.Error:
+                usable = False
+        if not usable:
+            self.close_quietly(connection)
+            self.release_slot()
+            return
+        with self._cond:
+            self._idle.append((time.monotonic(), connection))
+            self._cond.notify()
+
+    def release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def is_healthy(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Database.Error:
+            return False
+        return True
+
+    def close_quietly(self, connection):
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """ PostgreSQL backend taking connections from a per-process pool
+
+    Meant for threaded workers with ``CONN_MAX_AGE = 0``: closing a
+    connection at the end of a request returns it to the pool instead
+    of ending the server session. Pool options come from the ``POOL``
+    key of the database settings.
+    """
+
+    def get_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    lambda: Database.connect(**conn_params),
+                    alias=self.alias,
+                    health_check_after=settings.DB_HEALTH_CHECK_AFTER,
+                    **self.settings_dict.get("POOL", {}),
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.get()
+        # same isolation level handling as the parent, which connects
+        # directly
+        options = self.settings_dict["OPTIONS"]
+        self.isolation_level = options.get(
+            "isolation_level", connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.put(self.connection)
@@ -0,0 +1,128 @@
+import random
+import time
+import tracemalloc
+
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.middleware import QueryStats, observe_queries
+from core.models import Tag, Ingredient, Recipe
+from core.search import update_search_vectors
+from core.stats import rebuild_user_stats
+
+
+def seed_user_data(
+    user, recipes, tags=50, ingredients=50, fan_out=3, batch_size=5000
+):
+    """ Bulk creates recipes with random tags and ingredients for user """
+    rnd = random.Random(user.pk)
+    tag_objs = Tag.objects.bulk_create(
+        Tag(user=user, name=f"tag {i}") for i in range(tags)
+    )
+    ing_objs = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f"ingredient {i}")
+        for i in range(ingredients)
+    )
+    # only half of tags and ingredients get used, like in real books
+    used_tags = tag_objs[: max(1, tags // 2)]
+    used_ings = ing_objs[: max(1, ingredients // 2)]
+    tag_through = Recipe.tags.through
+    ing_through = Recipe.ingredients.through
+    for start in range(0, recipes, batch_size):
+        count = min(batch_size, recipes - start)
+        batch = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f"recipe {start + i}",
+                time_minutes=rnd.randint(1, 240),
+                price=rnd.randint(100, 99999) / 100,
+            )
+            for i in range(count)
+        )
+        tag_links = []
+        ing_links = []
+        for recipe in batch:
+            for tag in rnd.sample(used_tags, min(fan_out, len(used_tags))):
+                tag_links.append(tag_through(recipe=recipe, tag=tag))
+            for ing in rnd.sample(used_ings, min(fan_out, len(used_ings))):
+                ing_links.append(ing_through(recipe=recipe, ingredient=ing))
+        tag_through.objects.bulk_create(tag_links)
+        ing_through.objects.bulk_create(ing_links)
+        update_search_vectors(recipe.pk for recipe in batch)
+    rebuild_user_stats([user.pk])
+    vacuum_analyze_tables()
+    return tag_objs, ing_objs
+
+
+def vacuum_analyze_tables():
+    """ Refreshes planner statistics and visibility map after seeding """
+    tables = [
+        Tag._meta.db_table,
+        Ingredient._meta.db_table,
+        Recipe._meta.db_table,
+        Recipe.tags.through._meta.db_table,
+        Recipe.ingredients.through._meta.db_table,
+    ]
+    # VACUUM cannot run in a transaction, e.g. inside a test case
+    command = "ANALYZE" if connection.in_atomic_block else "VACUUM ANALYZE"
+    with connection.cursor() as cursor:
+        for table in tables:
+            name = connection.ops.quote_name(table)
+            cursor.execute(f"{command} {name}")
+
+
+def viewset_queryset(viewset_class, user, action="list", params=None):
+    """ Returns the queryset a viewset builds for user and query params """
+    request = Request(APIRequestFactory().get("/", params or {}))
+    request.user = user
+    view = viewset_class(request=request, action=action, format_kwarg=None)
+    return view.get_queryset()
+
+
+def time_queryset(queryset, repeat=10):
+    """ Evaluates queryset repeat times and returns durations in ms """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset.all())
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def time_calls(func, repeat=10):
+    """ Calls func repeat times and returns durations in ms """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def percentile(values, pct):
+    """ Returns nearest-rank percentile of values """
+    ordered = sorted(values)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def measure_call(func):
+    """ Calls func and returns its result, duration in ms and the number
+    of queries it ran """
+    stats = QueryStats()
+    with observe_queries(stats):
+        start = time.perf_counter()
+        result = func()
+        duration = (time.perf_counter() - start) * 1000
+    return result, duration, stats.count
+
+
+def measure_allocations(func):
+    """ Calls func with tracemalloc on and returns peak allocated bytes """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+VERSION_KEY = "user-data-version:{}"
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_user_version(user_id):
+    """ Returns version of the user's tags, ingredients and recipes """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        # seeded from the clock, so a counter lost on eviction or restart
+        # never goes back to a value older responses were cached under
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    """ Invalidates cached responses built from the user's data """
+    try:
+        get_cache().incr(VERSION_KEY.format(user_id))
+    except ValueError:
+        get_user_version(user_id)
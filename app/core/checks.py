@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_debug_in_production(app_configs, **kwargs):
+    """ Debug mode keeps every SQL query of a process in memory """
+    if settings.PRODUCTION and settings.DEBUG:
+        return [
+            Error(
+                "DEBUG is on in production.",
+                hint="Unset DJANGO_DEBUG, debug mode records every SQL "
+                "query in connection.queries.",
+                id="core.E001",
+            )
+        ]
+    return []
+
+
+@register(Tags.caches)
+def check_shared_response_cache(app_configs, **kwargs):
+    """ Worker processes each have their own in-process cache """
+    if not settings.PRODUCTION:
+        return []
+    if isinstance(caches[settings.RESPONSE_CACHE_ALIAS], LocMemCache):
+        return [
+            Error(
+                "The response cache is local to each process in "
+                "production.",
+                hint="Set CACHE_LOCATION, otherwise a write bumps the data "
+                "version and pins reads to the primary in one worker "
+                "only, and the others keep serving stale lists.",
+                id="core.E002",
+            )
+        ]
+    return []
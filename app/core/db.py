@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+
+
+def mark_idle(connection):
+    """ Remembers when a persistent connection was last used """
+    if connection.connection is not None:
+        connection.idle_since = time.monotonic()
+
+
+def check_idle_connection(connection):
+    """ Closes a persistent connection that sat idle long enough to have
+    been dropped by the server or a proxy and no longer answers
+
+    Django only tests connections after errors, without this the first
+    query of a request fails instead.
+    """
+    idle_since = getattr(connection, "idle_since", None)
+    if connection.connection is None or idle_since is None:
+        return
+    if time.monotonic() - idle_since < settings.DB_HEALTH_CHECK_AFTER:
+        return
+    connection.idle_since = None
+    if not connection.is_usable():
+        connection.close()
@@ -0,0 +1,295 @@
+import io
+import json
+import platform
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.benchmarks import (
+    measure_allocations,
+    measure_call,
+    percentile,
+    seed_user_data,
+)
+from core.cache import bump_user_version
+from core.models import AuthToken
+from core.tasks import wait_for_background_tasks
+
+
+class Command(BaseCommand):
+    """Benchmark the recipe and user API endpoints in-process"""
+
+    help = (
+        "Seeds throwaway users, drives the API through the test client and "
+        "reports latency, queries and allocations per endpoint as JSON"
+    )
+    # unique per run, a run killed before cleanup leaves its users behind
+    email = "bench-api-{run}-{i}@example.com"
+    password = "bench-password"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2)
+        parser.add_argument("--recipes", type=int, default=2000)
+        parser.add_argument("--tags", type=int, default=50)
+        parser.add_argument("--ingredients", type=int, default=50)
+        parser.add_argument("--fan-out", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--output", help="File to write results to")
+        parser.add_argument(
+            "--baseline", help="Results of an earlier run to compare with"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=20,
+            help="Allowed p50 slowdown against the baseline, in percent",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["repeat"] < 1:
+            raise CommandError("--users and --repeat must be positive")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        users = []
+        run = uuid.uuid4().hex
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            MEDIA_ROOT=media_root,
+        ):
+            try:
+                for i in range(options["users"]):
+                    user = get_user_model().objects.create_user(
+                        email=self.email.format(run=run, i=i),
+                        password=self.password,
+                    )
+                    users.append(user)
+                    self.stdout.write(f">Seeding {user.email}")
+                    seeded = seed_user_data(
+                        user,
+                        recipes=options["recipes"],
+                        tags=options["tags"],
+                        ingredients=options["ingredients"],
+                        fan_out=options["fan_out"],
+                    )
+                # every user got the same volume, requests run as the last
+                user = users[-1]
+                results = {
+                    name: self.run_scenario(
+                        user, method, path, data, cached, options["repeat"]
+                    )
+                    for name, method, path, data, cached in self.get_scenarios(
+                        user, *seeded
+                    )
+                }
+            finally:
+                wait_for_background_tasks()
+                for user in users:
+                    user.delete()
+
+        report = {
+            "meta": {
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                **{
+                    key: options[key]
+                    for key in (
+                        "users",
+                        "recipes",
+                        "tags",
+                        "ingredients",
+                        "fan_out",
+                        "repeat",
+                    )
+                },
+            },
+            "results": results,
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: p50={result['p50_ms']:.2f}ms "
+                f"p99={result['p99_ms']:.2f}ms "
+                f"queries={result['queries']} "
+                f"peak={result['alloc_peak_kib']:.0f}KiB"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+        if baseline is not None:
+            self.compare(results, baseline["results"], options["tolerance"])
+
+    def get_scenarios(self, user, tags, ingredients):
+        """ Returns (name, method, path, data factory, cached) tuples """
+        recipe = user.recipe_set.order_by("id").first()
+        tag_ids = ",".join(str(tag.id) for tag in tags[:2])
+        ing_ids = ",".join(str(ing.id) for ing in ingredients[:2])
+        recipes_url = reverse("recipe:recipe-list")
+        new_recipe = {
+            "title": "bench recipe",
+            "time_minutes": 10,
+            "price": "5.00",
+            "tags": [tag.id for tag in tags[:3]],
+            "ingredients": [ing.id for ing in ingredients[:3]],
+        }
+        return [
+            ("recipes list", "get", recipes_url, None, False),
+            ("recipes list cached", "get", recipes_url, None, True),
+            (
+                "recipes page",
+                "get",
+                f"{recipes_url}?page_size=100",
+                None,
+                False,
+            ),
+            (
+                "recipes by tags",
+                "get",
+                f"{recipes_url}?tags={tag_ids}&ingredients={ing_ids}",
+                None,
+                False,
+            ),
+            (
+                "recipes by price",
+                "get",
+                f"{recipes_url}?price_max=50&ordering=price&page_size=100",
+                None,
+                False,
+            ),
+            (
+                "recipes search",
+                "get",
+                f"{recipes_url}?search=recipe&page_size=100",
+                None,
+                False,
+            ),
+            (
+                "recipe detail",
+                "get",
+                reverse("recipe:recipe-detail", args=[recipe.id]),
+                None,
+                False,
+            ),
+            ("recipe create", "post", recipes_url, lambda: new_recipe, False),
+            (
+                "recipe upload image",
+                "post",
+                reverse("recipe:recipe-upload-image", args=[recipe.id]),
+                lambda: {"image": self.sample_image()},
+                False,
+            ),
+            ("tags list", "get", reverse("recipe:tag-list"), None, False),
+            (
+                "tags assigned_only",
+                "get",
+                f"{reverse('recipe:tag-list')}?assigned_only=1",
+                None,
+                False,
+            ),
+            (
+                "tags popular",
+                "get",
+                f"{reverse('recipe:tag-list')}?with_counts=1"
+                "&ordering=-recipe_count",
+                None,
+                False,
+            ),
+            (
+                "ingredients list",
+                "get",
+                reverse("recipe:ingredient-list"),
+                None,
+                False,
+            ),
+            (
+                "ingredients autocomplete",
+                "get",
+                f"{reverse('recipe:ingredient-list')}?search=ingred",
+                None,
+                False,
+            ),
+            (
+                "token",
+                "post",
+                reverse("user:token"),
+                lambda: {"email": user.email, "password": self.password},
+                False,
+            ),
+        ]
+
+    def sample_image(self):
+        file = io.BytesIO()
+        Image.new("RGB", (800, 600)).save(file, format="JPEG")
+        file.name = "bench.jpg"
+        file.seek(0)
+        return file
+
+    def run_scenario(self, user, method, path, data, cached, repeat):
+        token = AuthToken.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        fmt = "multipart" if "upload-image" in path else "json"
+
+        def send():
+            if not cached:
+                # drops only this user's cached lists, the cache may be
+                # shared with live workers
+                bump_user_version(user.pk)
+            kwargs = {"format": fmt} if data else {}
+            response = getattr(client, method)(
+                path, data() if data else None, **kwargs
+            )
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{method.upper()} {path}: {response.status_code}"
+                )
+
+        # first call warms up caches, connections and imports
+        send()
+        durations = []
+        queries = []
+        for _ in range(repeat):
+            _response, duration, count = measure_call(send)
+            durations.append(duration)
+            queries.append(count)
+        peak = measure_allocations(send)
+        return {
+            "requests": repeat,
+            "p50_ms": percentile(durations, 50),
+            "p99_ms": percentile(durations, 99),
+            "mean_ms": sum(durations) / len(durations),
+            "queries": percentile(queries, 50),
+            "alloc_peak_kib": peak / 1024,
+        }
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, before in baseline.items():
+            after = results.get(name)
+            if after is None:
+                continue
+            limit = before["p50_ms"] * (1 + tolerance / 100)
+            if after["p50_ms"] > limit:
+                regressions.append(
+                    f"{name}: p50 {before['p50_ms']:.2f}ms -> "
+                    f"{after['p50_ms']:.2f}ms"
+                )
+            if after["queries"] > before["queries"]:
+                regressions.append(
+                    f"{name}: queries {before['queries']} -> "
+                    f"{after['queries']}"
+                )
+        if regressions:
+            raise CommandError("Regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,70 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import (
+    percentile,
+    seed_user_data,
+    time_queryset,
+    viewset_queryset,
+)
+from core.models import Tag
+from recipe.views import TagViewSet
+
+
+class Command(BaseCommand):
+    """Compare JOIN+DISTINCT and EXISTS plans of assigned_only tag list"""
+
+    help = "Seeds recipes for a throwaway user and times both queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100000)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--fan-out", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        # unique per run, a run killed before cleanup leaves its user behind
+        user = get_user_model().objects.create_user(
+            email=f"bench-assigned-{uuid.uuid4().hex}@example.com",
+            password="bench",
+        )
+        try:
+            self.stdout.write(f">Seeding {options['recipes']} recipes")
+            seed_user_data(
+                user,
+                recipes=options["recipes"],
+                tags=options["tags"],
+                fan_out=options["fan_out"],
+            )
+            querysets = [
+                (
+                    "join+distinct",
+                    Tag.objects.filter(user=user, recipe__isnull=False)
+                    .order_by("-name", "-id")
+                    .distinct(),
+                ),
+                (
+                    "exists",
+                    viewset_queryset(
+                        TagViewSet, user, params={"assigned_only": 1}
+                    ),
+                ),
+            ]
+            for name, queryset in querysets:
+                self.report(name, queryset, options["repeat"])
+        finally:
+            user.delete()
+
+    def report(self, name, queryset, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+        self.stdout.write(queryset.explain(analyze=True))
+        durations = time_queryset(queryset, repeat)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: rows={queryset.count()} "
+                f"p50={percentile(durations, 50):.2f}ms "
+                f"p99={percentile(durations, 99):.2f}ms"
+            )
+        )
@@ -0,0 +1,67 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from core.benchmarks import percentile, time_calls
+
+
+class Command(BaseCommand):
+    """Measure password verification cost of the configured hashers"""
+
+    help = (
+        "Times password checks of each hasher on one thread, so the "
+        "reported rate is logins per second per core"
+    )
+    password = "bench-password"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=20)
+        parser.add_argument(
+            "--hashers",
+            nargs="+",
+            choices=sorted(settings.PASSWORD_HASHER_CHOICES),
+            default=sorted(settings.PASSWORD_HASHER_CHOICES),
+        )
+
+    def handle(self, *args, **options):
+        if options["logins"] < 1:
+            raise CommandError("--logins must be positive")
+        for name in options["hashers"]:
+            hasher = import_string(settings.PASSWORD_HASHER_CHOICES[name])()
+            encoded = hasher.encode(self.password, hasher.salt())
+            durations = time_calls(
+                lambda: hasher.verify(self.password, encoded),
+                options["logins"],
+            )
+            self.report(f"verify {name}", durations)
+
+        # unique per run, a run killed before cleanup leaves its user behind
+        user = get_user_model().objects.create_user(
+            email=f"bench-logins-{uuid.uuid4().hex}@example.com",
+            password=self.password,
+        )
+        try:
+            durations = time_calls(
+                lambda: authenticate(
+                    username=user.email, password=self.password
+                ),
+                options["logins"],
+            )
+            self.report(
+                f"authenticate {settings.PASSWORD_HASHER}", durations
+            )
+        finally:
+            user.delete()
+
+    def report(self, name, durations):
+        mean = sum(durations) / len(durations)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: {1000 / mean:.1f} logins/s per core "
+                f"p50={percentile(durations, 50):.2f}ms "
+                f"p99={percentile(durations, 99):.2f}ms"
+            )
+        )
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import viewset_queryset
+from core.models import Tag, Ingredient
+from recipe.pagination import KeysetPagination
+from recipe.views import TagViewSet, IngredientViewSet, RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Print EXPLAIN output of the typical queries of each viewset"""
+
+    help = "Shows query plans so index usage of list endpoints can be checked"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--email", help="User to build queries for, first user if unset"
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run EXPLAIN ANALYZE, executes the queries",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["email"]:
+            users = users.filter(email=options["email"])
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to build queries for")
+        self.analyze = options["analyze"]
+        for name, viewset, params in self.get_cases(user):
+            queryset = viewset_queryset(viewset, user, params=params)
+            self.explain(f"{name}: first page", self.first_page(queryset))
+            self.explain(f"{name}: next page", self.next_page(queryset))
+        recipe = viewset_queryset(RecipeViewSet, user).first()
+        if recipe is not None:
+            queryset = viewset_queryset(RecipeViewSet, user, "retrieve")
+            self.explain("recipe detail", queryset.filter(pk=recipe.pk))
+
+    def get_cases(self, user):
+        tag_ids = self.sample_ids(Tag, user)
+        ing_ids = self.sample_ids(Ingredient, user)
+        return [
+            ("tags", TagViewSet, {}),
+            ("tags assigned_only", TagViewSet, {"assigned_only": 1}),
+            ("ingredients", IngredientViewSet, {}),
+            (
+                "ingredients assigned_only",
+                IngredientViewSet,
+                {"assigned_only": 1},
+            ),
+            ("recipes", RecipeViewSet, {}),
+            ("recipes by tags", RecipeViewSet, {"tags": tag_ids}),
+            (
+                "recipes by all tags",
+                RecipeViewSet,
+                {"tags": tag_ids, "match": "all"},
+            ),
+            (
+                "recipes by ingredients",
+                RecipeViewSet,
+                {"ingredients": ing_ids},
+            ),
+            (
+                "recipes by price",
+                RecipeViewSet,
+                {"price_max": "10", "ordering": "price"},
+            ),
+            (
+                "recipes by time",
+                RecipeViewSet,
+                {"time_max": 30, "ordering": "-time_minutes"},
+            ),
+        ]
+
+    def sample_ids(self, model, user, count=2):
+        ids = model.objects.filter(user=user).values_list("id", flat=True)
+        return ",".join(str(pk) for pk in ids[:count]) or "0"
+
+    def first_page(self, queryset):
+        return queryset[: KeysetPagination.page_size]
+
+    def next_page(self, queryset):
+        """ Seek page that starts after the first page """
+        paginator = KeysetPagination()
+        ordering = paginator.get_ordering(queryset)
+        page = list(self.first_page(queryset))
+        if not page:
+            return self.first_page(queryset)
+        values = [getattr(page[-1], field) for field, _desc in ordering]
+        seek = paginator.get_seek_filter(ordering, values)
+        return self.first_page(queryset.filter(seek))
+
+    def explain(self, name, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+        self.stdout.write(queryset.explain(analyze=self.analyze))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import Recipe
+from recipe.images import process_recipe_image
+
+
+class Command(BaseCommand):
+    """Build missing image renditions, e.g. lost with a restarted worker"""
+
+    def handle(self, *args, **options):
+        recipe_ids = (
+            Recipe.objects.exclude(image="")
+            .exclude(image=None)
+            .filter(Q(image_thumbnail="") | Q(image_thumbnail=None))
+            .values_list("id", flat=True)
+        )
+        count = 0
+        for recipe_id in recipe_ids.iterator():
+            process_recipe_image(recipe_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} images"))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Delete expired auth tokens in small batches"""
+
+    help = (
+        "Deletes auth tokens that expired before the command started, "
+        "--batch-size keys per delete"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        # fixed cutoff, tokens expiring while the purge runs wait for the
+        # next run instead of keeping the loop going
+        expired = AuthToken.objects.expired(timezone.now())
+        total = 0
+        while True:
+            keys = list(
+                expired.values_list("key", flat=True)[: options["batch_size"]]
+            )
+            if not keys:
+                break
+            AuthToken.objects.filter(key__in=keys).delete()
+            total += len(keys)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} tokens"))
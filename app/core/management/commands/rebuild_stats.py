@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    """Recompute recipe summaries and tag and ingredient usage counts"""
+
+    help = (
+        "Recomputes recipe stats and tag and ingredient usage counts of "
+        "every user, or of --users, from their current rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches",
+        )
+        parser.add_argument(
+            "--users", nargs="+", type=int, help="Only rebuild these users"
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk")
+        if options["users"]:
+            users = users.filter(pk__in=options["users"])
+        last_pk = 0
+        total = 0
+        while True:
+            # keyset over the primary key, each batch is one index range
+            ids = list(
+                users.filter(pk__gt=last_pk).values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                rebuild_user_stats(ids)
+            last_pk = ids[-1]
+            total += len(ids)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt stats of {total} users")
+        )
@@ -1,19 +1,33 @@
 import time
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django com to pause execution until db is available """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Seconds to keep trying before giving up",
+        )
+        parser.add_argument("--max-delay", type=float, default=8)
+
     def handle(self, *args, **options):
         self.stdout.write(">Waiting for db")
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options["timeout"]
+        delay = 0.5
+        while True:
             try:
-                db_conn = connections["default"]
+                connections["default"].ensure_connection()
+                break
             except OperationalError:
-                self.stdout.write("Db is unavailable, waiting")
-                time.sleep(1)
+                if time.monotonic() >= deadline:
+                    raise CommandError("Db is still unavailable, giving up")
+                self.stdout.write(f"Db is unavailable, waiting {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, options["max_delay"])
         self.stdout.write(self.style.SUCCESS("DB is available"))
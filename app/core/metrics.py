@@ -0,0 +1,408 @@
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def escape_label_value(value):
+    return (
+        str(value)
+        .replace("\\", r"\\")
+        .replace('"', r"\"")
+        .replace("\n", r"\n")
+    )
+
+
+def format_labels(names, values, **extra):
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    labels = ",".join(
+        f'{name}="{escape_label_value(value)}"' for name, value in pairs
+    )
+    return "{" + labels + "}"
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Counter:
+    """ Monotonic counter per label values """
+
+    kind = "counter"
+    # counts of exited processes stay in the totals
+    survives_exit = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(value, other):
+        return value + other
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.values()
+        for labels, value in sorted(values.items()):
+            label_str = format_labels(self.labelnames, labels)
+            yield f"{self.name}{label_str} {value}"
+
+
+class Gauge:
+    """ Current values read from ``collect`` at render time, which
+    returns a mapping of label values to numbers """
+
+    kind = "gauge"
+    survives_exit = False
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def values(self):
+        return dict(self.collect())
+
+    @staticmethod
+    def merge(value, other):
+        return value + other
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.values()
+        for labels, value in sorted(values.items()):
+            label_str = format_labels(self.labelnames, labels)
+            yield f"{self.name}{label_str} {value}"
+
+
+class Histogram:
+    """ Bucketed observations per label values, buckets are upper bounds
+    as in the Prometheus ``le`` label """
+
+    kind = "histogram"
+    survives_exit = True
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # one slot per bucket plus the +Inf one
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def values(self):
+        """ Returns {labels: [bucket counts, sum]} """
+        with self._lock:
+            return {
+                labels: [list(counts), total]
+                for labels, (counts, total) in self._series.items()
+            }
+
+    @staticmethod
+    def merge(value, other):
+        counts = [a + b for a, b in zip(value[0], other[0])]
+        return [counts, value[1] + other[1]]
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.values()
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label_str = format_labels(self.labelnames, labels, le=bound)
+                yield f"{self.name}_bucket{label_str} {cumulative}"
+            label_str = format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {total}"
+            yield f"{self.name}_count{label_str} {cumulative}"
+
+
+METRIC_TYPES = {cls.kind: cls for cls in (Counter, Gauge, Histogram)}
+
+# counters and histograms of exited processes, folded into one snapshot
+EXITED_SNAPSHOT = "exited.json"
+
+
+def read_snapshot(path):
+    """ Returns the snapshot stored at path, None when there is none """
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}
+
+
+def write_snapshot(path, snapshot):
+    with open(f"{path}.tmp", "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    # readers never see a partly written snapshot
+    os.replace(f"{path}.tmp", path)
+
+
+def merge_values(values, merge, entries):
+    """ Adds [labels, value] entries of a snapshot to {labels: value} """
+    for labels, value in entries:
+        labels = tuple(labels)
+        if labels in values:
+            value = merge(values[labels], value)
+        values[labels] = value
+
+
+class Registry:
+    """ Collection of metrics rendered in the Prometheus text format
+
+    Values live in process memory. With settings.METRICS_DIR set, every
+    process also writes a snapshot of its values there, at most every
+    ``flush_interval`` seconds, and a render sums the snapshots of all
+    processes. So whichever gunicorn worker answers a scrape reports
+    the whole server.
+
+    Snapshots of exited processes are folded into one: counters and
+    histograms are added to ``exited.json`` and gauges dropped. The
+    directory stays as large as the number of live workers however
+    often they are recycled, and a reused pid starts from a fresh file.
+    """
+
+    def __init__(self, flush_interval=1.0):
+        self.metrics = []
+        self.flush_interval = flush_interval
+        self._flushed = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return getattr(settings, "METRICS_DIR", None)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    @contextmanager
+    def locked(self, operation):
+        """ Holds the directory lock, exclusive while folding so no
+        reader sees a snapshot both folded and still in place """
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    def flush(self, force=False):
+        """ Writes values of this process to the metrics directory """
+        directory = self.directory
+        if directory is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if (
+                not force
+                and self._flushed is not None
+                and now - self._flushed < self.flush_interval
+            ):
+                return
+            self._flushed = now
+            snapshot = {
+                metric.name: {
+                    "kind": metric.kind,
+                    "values": [
+                        [list(labels), value]
+                        for labels, value in metric.values().items()
+                    ],
+                }
+                for metric in self.metrics
+            }
+            write_snapshot(
+                os.path.join(directory, f"{os.getpid()}.json"), snapshot
+            )
+
+    def fold(self, pid):
+        """ Moves the snapshot of exited process pid into the exited one
+
+        Entries carry their metric kind, so the gunicorn master can fold
+        metrics it never registered itself.
+        """
+        directory = self.directory
+        if directory is None:
+            return
+        path = os.path.join(directory, f"{pid}.json")
+        exited_path = os.path.join(directory, EXITED_SNAPSHOT)
+        with self.locked(fcntl.LOCK_EX):
+            snapshot = read_snapshot(path)
+            if snapshot is None:
+                return
+            exited = read_snapshot(exited_path) or {}
+            for name, entry in snapshot.items():
+                metric_type = METRIC_TYPES.get(entry.get("kind"))
+                if metric_type is None or not metric_type.survives_exit:
+                    continue
+                folded = exited.setdefault(
+                    name, {"kind": metric_type.kind, "values": []}
+                )
+                values = {}
+                merge_values(values, metric_type.merge, folded["values"])
+                merge_values(values, metric_type.merge, entry["values"])
+                folded["values"] = [
+                    [list(labels), value] for labels, value in values.items()
+                ]
+            write_snapshot(exited_path, exited)
+            os.remove(path)
+
+    def collect(self):
+        """ Returns {metric name: {labels: value}} of this process, with
+        the snapshots of the other processes added when shared """
+        collected = {metric.name: metric.values() for metric in self.metrics}
+        directory = self.directory
+        if directory is None:
+            return collected
+        pids = []
+        for filename in os.listdir(directory):
+            pid, extension = os.path.splitext(filename)
+            if extension == ".json" and pid.isdigit():
+                pids.append(int(pid))
+        # left behind when no gunicorn master folded them on exit
+        for pid in pids:
+            if not process_alive(pid):
+                self.fold(pid)
+        with self.locked(fcntl.LOCK_SH):
+            filenames = [
+                EXITED_SNAPSHOT,
+                *(
+                    f"{pid}.json"
+                    for pid in sorted(pids)
+                    if pid != os.getpid() and process_alive(pid)
+                ),
+            ]
+            for filename in filenames:
+                snapshot = read_snapshot(os.path.join(directory, filename))
+                for metric in self.metrics:
+                    entry = (snapshot or {}).get(metric.name)
+                    if entry is not None:
+                        merge_values(
+                            collected[metric.name],
+                            metric.merge,
+                            entry["values"],
+                        )
+        return collected
+
+    def clear(self):
+        """ Removes snapshots of an earlier run of the server """
+        directory = self.directory
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for filename in os.listdir(directory):
+            if filename.endswith((".json", ".tmp")):
+                os.remove(os.path.join(directory, filename))
+
+    def render(self):
+        collected = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(collected[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(
+    Counter(
+        "http_requests_total",
+        "Requests by route, method and status",
+        ("route", "method", "status"),
+    )
+)
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time until the response is handed to the server",
+        ("route", "method"),
+    )
+)
+REQUEST_DB_TIME = registry.register(
+    Histogram(
+        "http_request_db_seconds",
+        "Time spent executing SQL per request",
+        ("route", "method"),
+    )
+)
+REQUEST_SERIALIZE_TIME = registry.register(
+    Histogram(
+        "http_request_serialize_seconds",
+        "Time spent in serializers building response data, without SQL",
+        ("route", "method"),
+    )
+)
+REQUEST_RENDER_TIME = registry.register(
+    Histogram(
+        "http_request_render_seconds",
+        "Time spent encoding response data",
+        ("route", "method"),
+    )
+)
+REQUEST_QUERIES = registry.register(
+    Histogram(
+        "http_request_queries",
+        "SQL queries executed per request",
+        ("route", "method"),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
@@ -0,0 +1,124 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics
+from core.routers import current_request, pin_user_to_primary
+
+
+class QueryStats:
+    """ Execute wrapper counting queries and their time on a connection """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def observe_queries(stats):
+    """ Installs stats as execute wrapper of every configured database """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+class RequestMetricsMiddleware:
+    """ Records query count, db, serialize, render and total time of
+    every request
+
+    serialize is time spent in serializers using
+    core.serializers.TimedSerializerMixin, render the encoding of their
+    output. Timings are sent back in a ``Server-Timing`` header and
+    recorded in histograms labeled by route name
+    (``recipe:recipe-list``), which are served by ``core.views.metrics``.
+    Only connections of the request thread are observed, and for
+    streaming responses the total stops when the body starts streaming.
+    """
+
+    unmatched_route = "<unmatched>"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request._query_stats = stats
+        request._serializing = False
+        request._serialize_duration = 0.0
+        request._render_duration = 0.0
+        start = time.perf_counter()
+        with observe_queries(stats):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        serialize = request._serialize_duration
+        render = request._render_duration
+        app = max(total - stats.duration - serialize - render, 0.0)
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} '
+                f'queries"',
+                f"serialize;dur={serialize * 1000:.2f}",
+                f"render;dur={render * 1000:.2f}",
+                f"app;dur={app * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match else self.unmatched_route
+        labels = (route, request.method)
+        metrics.REQUESTS.inc(*labels, str(response.status_code))
+        metrics.REQUEST_LATENCY.observe(total, *labels)
+        metrics.REQUEST_DB_TIME.observe(stats.duration, *labels)
+        metrics.REQUEST_SERIALIZE_TIME.observe(serialize, *labels)
+        metrics.REQUEST_RENDER_TIME.observe(render, *labels)
+        metrics.REQUEST_QUERIES.observe(stats.count, *labels)
+        metrics.registry.flush()
+        return response
+
+    def process_template_response(self, request, response):
+        """ DRF responses render right after this hook """
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._render_duration = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """ Exposes the request to core.routers.ReplicaRouter and pins users
+    to the primary after unsafe requests
+
+    Runs after authentication, DRF copies its user onto the request.
+    Streamed response bodies are produced after this returns, so they
+    read from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        if request.method not in SAFE_METHODS:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_user_to_primary(user.pk)
+        return response
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-17 22:28
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0006_composite_indexes")]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_medium",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to=core.models.recipe_image_file_path,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="image_thumbnail",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to=core.models.recipe_image_file_path,
+            ),
+        ),
+    ]
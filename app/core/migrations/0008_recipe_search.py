@@ -0,0 +1,73 @@
+# Generated by Django 2.2.28 on 2026-10-17 22:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# frozen copy of core.search.UPDATE_VECTORS_SQL for all rows
+BACKFILL_SQL = """
+UPDATE core_recipe AS r SET search_vector =
+    setweight(to_tsvector('english', r.title), 'A')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(t.name, ' ') FROM core_tag t
+        JOIN core_recipe_tags rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(i.name, ' ') FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'B')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0007_recipe_image_renditions")]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="core_ingredient_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="core_recipe_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"],
+                name="core_tag_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        # name__istartswith compiles to UPPER(name::text) LIKE UPPER(...)
+        migrations.RunSQL(
+            "CREATE INDEX core_tag_name_upper_trgm_idx ON core_tag "
+            "USING gin (UPPER(name::text) gin_trgm_ops)",
+            "DROP INDEX core_tag_name_upper_trgm_idx",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX core_ingredient_name_upper_trgm_idx "
+            "ON core_ingredient USING gin (UPPER(name::text) gin_trgm_ops)",
+            "DROP INDEX core_ingredient_name_upper_trgm_idx",
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.28 on 2026-10-17 22:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_authtoken_tokens(apps, schema_editor):
+    """ Moves never expiring DRF tokens over, their lifetime starts now
+    so clients are not logged out by the deploy """
+    Token = apps.get_model("authtoken", "Token")
+    AuthToken = apps.get_model("core", "AuthToken")
+    now = django.utils.timezone.now()
+    AuthToken.objects.bulk_create(
+        (
+            AuthToken(
+                key=token.key,
+                user_id=token.user_id,
+                created=now,
+                last_used=now,
+            )
+            for token in Token.objects.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authtoken", "0002_auto_20160226_1747"),
+        ("core", "0009_range_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthToken",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                (
+                    "last_used",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="auth_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(copy_authtoken_tokens, migrations.RunPython.noop),
+    ]
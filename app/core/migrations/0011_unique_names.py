@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+# moves recipe links of duplicate names onto the oldest row of each
+# (user, name) group, then drops the duplicates. Deferred foreign key
+# checks are run right away, postgres refuses to alter a table that
+# still has them pending.
+DEDUPE_SQL = """
+CREATE TEMPORARY TABLE {table}_dupes ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, MIN(id) OVER (PARTITION BY user_id, name) AS keep_id
+        FROM core_{table}
+    ) AS grouped WHERE id <> keep_id;
+INSERT INTO core_recipe_{table}s (recipe_id, {table}_id)
+    SELECT l.recipe_id, d.keep_id FROM core_recipe_{table}s l
+    JOIN {table}_dupes d ON d.id = l.{table}_id
+    ON CONFLICT DO NOTHING;
+DELETE FROM core_recipe_{table}s l USING {table}_dupes d
+    WHERE l.{table}_id = d.id;
+DELETE FROM core_{table} t USING {table}_dupes d WHERE t.id = d.id;
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0010_auth_token")]
+
+    operations = [
+        migrations.RunSQL(
+            DEDUPE_SQL.format(table="tag"), migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(
+            DEDUPE_SQL.format(table="ingredient"), migrations.RunSQL.noop
+        ),
+        migrations.RemoveIndex(
+            model_name="ingredient", name="core_ingredient_user_name_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="tag", name="core_tag_user_name_idx"
+        ),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                fields=("user", "name"), name="core_ingredient_user_name_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                fields=("user", "name"), name="core_tag_user_name_uniq"
+            ),
+        ),
+    ]
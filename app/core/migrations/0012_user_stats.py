@@ -0,0 +1,118 @@
+# Generated by Django 2.2.28 on 2026-10-17 22:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# frozen copy of core.stats.REBUILD_STATS_SQL for all users
+BACKFILL_STATS_SQL = """
+INSERT INTO core_userstats (
+    user_id, recipe_count, tag_count, ingredient_count,
+    price_total, price_min, price_max,
+    time_minutes_total, time_minutes_min, time_minutes_max
+)
+SELECT u.id, coalesce(r.count, 0),
+    (SELECT COUNT(*) FROM core_tag t WHERE t.user_id = u.id),
+    (SELECT COUNT(*) FROM core_ingredient i WHERE i.user_id = u.id),
+    coalesce(r.price_total, 0), r.price_min, r.price_max,
+    coalesce(r.time_minutes_total, 0), r.time_minutes_min,
+    r.time_minutes_max
+FROM core_usermodel u LEFT JOIN (
+    SELECT user_id, COUNT(*) AS count,
+        SUM(price) AS price_total, MIN(price) AS price_min,
+        MAX(price) AS price_max, SUM(time_minutes) AS time_minutes_total,
+        MIN(time_minutes) AS time_minutes_min,
+        MAX(time_minutes) AS time_minutes_max
+    FROM core_recipe GROUP BY user_id
+) r ON r.user_id = u.id
+"""
+
+BACKFILL_USAGE_SQL = """
+UPDATE core_{table} AS t SET recipe_count = l.count
+FROM (
+    SELECT {table}_id, COUNT(*) AS count FROM core_recipe_{table}s
+    GROUP BY {table}_id
+) l
+WHERE l.{table}_id = t.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0011_unique_names")]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("recipe_count", models.PositiveIntegerField(default=0)),
+                ("tag_count", models.PositiveIntegerField(default=0)),
+                ("ingredient_count", models.PositiveIntegerField(default=0)),
+                (
+                    "price_total",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14
+                    ),
+                ),
+                (
+                    "price_min",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=5, null=True
+                    ),
+                ),
+                (
+                    "price_max",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=5, null=True
+                    ),
+                ),
+                ("time_minutes_total", models.BigIntegerField(default=0)),
+                ("time_minutes_min", models.IntegerField(null=True)),
+                ("time_minutes_max", models.IntegerField(null=True)),
+            ],
+            options={"verbose_name_plural": "user stats"},
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="recipe_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="recipe_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                fields=["user", "recipe_count", "id"],
+                name="core_ingredient_user_count_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                fields=["user", "recipe_count", "id"],
+                name="core_tag_user_count_idx",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_STATS_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(
+            BACKFILL_USAGE_SQL.format(table="tag"), migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(
+            BACKFILL_USAGE_SQL.format(table="ingredient"),
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 2.2.28 on 2026-10-17 22:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0012_user_stats")]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="ingredient", options={"default_manager_name": "objects"}
+        ),
+        migrations.AlterModelOptions(
+            name="recipe", options={"default_manager_name": "objects"}
+        ),
+        migrations.AlterModelOptions(
+            name="tag", options={"default_manager_name": "objects"}
+        ),
+        migrations.RemoveConstraint(
+            model_name="ingredient", name="core_ingredient_user_name_uniq"
+        ),
+        migrations.RemoveConstraint(
+            model_name="tag", name="core_tag_user_name_uniq"
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_ingredient_updated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_recipe_updated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_tag_updated_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(deleted_at__isnull=True),
+                fields=("user", "name"),
+                name="core_ingredient_user_name_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(deleted_at__isnull=True),
+                fields=("user", "name"),
+                name="core_tag_user_name_uniq",
+            ),
+        ),
+    ]
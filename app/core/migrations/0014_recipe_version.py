@@ -0,0 +1,16 @@
+# Generated by Django 2.2.28 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("core", "0013_synced_models")]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        )
+    ]
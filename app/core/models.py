@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import (
     BaseUserManager,
     PermissionsMixin,
     AbstractBaseUser,
 )
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+from datetime import timedelta
+import secrets
 import uuid
 import os
 
@@ -47,27 +52,306 @@ class UserModel(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
-class Tag(models.Model):
+class AuthTokenQuerySet(models.QuerySet):
+    def expired(self, now=None):
+        """ Tokens idle or alive longer than settings.AUTH_TOKEN allows """
+        now = now or timezone.now()
+        idle_timeout = timedelta(seconds=settings.AUTH_TOKEN["idle_timeout"])
+        max_age = timedelta(seconds=settings.AUTH_TOKEN["max_age"])
+        return self.filter(
+            models.Q(last_used__lt=now - idle_timeout)
+            | models.Q(created__lt=now - max_age)
+        )
+
+
+class AuthToken(models.Model):
+    """ API token with sliding expiry, every login issues a new one """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="auth_tokens",
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = AuthTokenQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = secrets.token_hex(20)
+        return super().save(*args, **kwargs)
+
+    def is_expired(self, now=None):
+        now = now or timezone.now()
+        conf = settings.AUTH_TOKEN
+        return (
+            self.last_used < now - timedelta(seconds=conf["idle_timeout"])
+            or self.created < now - timedelta(seconds=conf["max_age"])
+        )
+
+    def touch(self, now=None):
+        """ Extends the token lifetime, writes at most once per
+        touch_interval so busy clients do not update on every request """
+        now = now or timezone.now()
+        interval = timedelta(seconds=settings.AUTH_TOKEN["touch_interval"])
+        if self.last_used > now - interval:
+            return False
+        self.last_used = now
+        # conditional, concurrent requests of one client write once
+        AuthToken.objects.filter(
+            key=self.key, last_used__lt=now - interval
+        ).update(last_used=now)
+        return True
+
+    def __str__(self):
+        return self.key
+
+
+# drops links of soft deleted rows, returns the other side of each link
+DELETE_LINKS_SQL = """
+DELETE FROM {table} WHERE {source} = ANY(%(ids)s) RETURNING {target}
+"""
+
+
+class SyncedQuerySet(models.QuerySet):
+    def delete(self):
+        """ Soft deletes the rows, see soft_delete """
+        queryset = self._chain()
+        queryset._for_write = True
+        with transaction.atomic(using=queryset.db, savepoint=False):
+            return queryset.soft_delete(list(queryset))
+
+    def soft_delete(self, objs):
+        """ Turns objs into tombstones and drops their recipe links
+
+        Links go with one statement per relation and the rows are marked
+        with one update, whatever the number of objs. Neither post_save
+        nor m2m_changed are sent, core.signals.bulk_deleted is sent once
+        instead.
+        """
+        # core.signals imports the models
+        from core.signals import bulk_deleted
+
+        opts = self.model._meta
+        if not objs:
+            return 0, {opts.label: 0}
+        ids = [obj.pk for obj in objs]
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+        quote = connection.ops.quote_name
+        unlinked = {}
+        with transaction.atomic(using=db, savepoint=False):
+            with connection.cursor() as cursor:
+                for field in opts.get_fields():
+                    if not field.many_to_many:
+                        continue
+                    m2m = field.field if field.auto_created else field
+                    through = m2m.remote_field.through._meta
+                    source, target = (
+                        quote(through.get_field(name).column)
+                        for name in (
+                            m2m.m2m_field_name(),
+                            m2m.m2m_reverse_field_name(),
+                        )
+                    )
+                    if field.auto_created:
+                        # reverse side, the rows are the link targets
+                        source, target = target, source
+                    sql = DELETE_LINKS_SQL.format(
+                        table=quote(through.db_table),
+                        source=source,
+                        target=target,
+                    )
+                    cursor.execute(sql, {"ids": ids})
+                    unlinked[field.related_model] = sorted(
+                        {pk for pk, in cursor.fetchall()}
+                    )
+            now = timezone.now()
+            self.model._base_manager.using(db).filter(pk__in=ids).update(
+                deleted_at=now, updated_at=now
+            )
+            for obj in objs:
+                obj.deleted_at = obj.updated_at = now
+            bulk_deleted.send(sender=self.model, objs=objs, unlinked=unlinked)
+        return len(objs), {opts.label: len(objs)}
+
+
+class SyncedManager(models.Manager.from_queryset(SyncedQuerySet)):
+    """ Hides soft deleted rows """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SyncedModel(models.Model):
+    """ Change timestamps and soft delete tombstones for sync clients
+
+    Deleting keeps the row with ``deleted_at`` set and drops its recipe
+    links, for one object as for a queryset, see SyncedQuerySet.
+    ``objects`` hides the tombstones, ``all_objects`` does not.
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = SyncedManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+        default_manager_name = "objects"
+
+    def delete(self, using=None, keep_parents=False):
+        manager = type(self)._default_manager.db_manager(using)
+        return manager.soft_delete([self])
+
+
+class NamedQuerySet(SyncedQuerySet):
+    def get_or_create_names(self, user, names):
+        """ Returns user's objects by name and the ones that were created
+
+        Existing names are read with one query and the missing ones are
+        inserted with one multi-row insert. Rows a concurrent request
+        inserted first are skipped by ON CONFLICT DO NOTHING, read back
+        and returned as found, not created.
+        """
+        names = set(names)
+        found = {
+            obj.name: obj for obj in self.filter(user=user, name__in=names)
+        }
+        missing = names - set(found)
+        if not missing:
+            return found, []
+        created = self._insert_new(
+            [self.model(user=user, name=name) for name in missing]
+        )
+        found.update((obj.name, obj) for obj in created)
+        raced = missing - set(found)
+        if raced:
+            found.update(
+                (obj.name, obj)
+                for obj in self.filter(user=user, name__in=raced)
+            )
+        return found, created
+
+    def _insert_new(self, objs):
+        """ Inserts objs skipping conflicting rows, returns the inserted
+        ones with their ids
+
+        bulk_create(ignore_conflicts=True) does not tell which rows were
+        inserted, RETURNING only lists those.
+        """
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        opts = self.model._meta
+        fields = [field for field in opts.concrete_fields if field != opts.pk]
+        values = []
+        for obj in objs:
+            values.extend(
+                field.get_db_prep_save(field.pre_save(obj, True), connection)
+                for field in fields
+            )
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in fields)
+        row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+        sql = (
+            f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+            f"VALUES {', '.join([row] * len(objs))} "
+            f"ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}, name"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            ids = {name: pk for pk, name in cursor.fetchall()}
+        inserted = []
+        for obj in objs:
+            if obj.name in ids:
+                obj.pk = ids[obj.name]
+                obj._state.adding = False
+                obj._state.db = db
+                inserted.append(obj)
+        return inserted
+
+
+class Tag(SyncedModel):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    # recipes linked to the tag, kept current by core.stats
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = SyncedManager.from_queryset(NamedQuerySet)()
+
+    class Meta(SyncedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="core_tag_user_name_uniq",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_tag_updated_idx",
+            ),
+            models.Index(
+                fields=["user", "recipe_count", "id"],
+                name="core_tag_user_count_idx",
+            ),
+            GinIndex(
+                fields=["name"],
+                name="core_tag_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(SyncedModel):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    # recipes linked to the ingredient, kept current by core.stats
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = SyncedManager.from_queryset(NamedQuerySet)()
+
+    class Meta(SyncedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="core_ingredient_user_name_uniq",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_ingredient_updated_idx",
+            ),
+            models.Index(
+                fields=["user", "recipe_count", "id"],
+                name="core_ingredient_user_count_idx",
+            ),
+            GinIndex(
+                fields=["name"],
+                name="core_ingredient_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(SyncedModel):
     title = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     time_minutes = models.IntegerField()
@@ -78,6 +362,83 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField("Ingredient")
     tags = models.ManyToManyField("Tag")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # renditions of image, filled in by recipe.images in the background
+    image_thumbnail = models.ImageField(
+        null=True, blank=True, upload_to=recipe_image_file_path
+    )
+    image_medium = models.ImageField(
+        null=True, blank=True, upload_to=recipe_image_file_path
+    )
+    # title, tag and ingredient names, kept current by core.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # bumped on every change of the recipe or its links by core.versions,
+    # the ETag of the recipe detail
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta(SyncedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                name="core_recipe_updated_idx",
+            ),
+            models.Index(
+                fields=["user", "title", "id"],
+                name="core_recipe_user_title_idx",
+            ),
+            models.Index(
+                fields=["user", "price", "id"],
+                name="core_recipe_user_price_idx",
+            ),
+            models.Index(
+                fields=["user", "time_minutes", "id"],
+                name="core_recipe_user_time_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="core_recipe_search_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # core.stats applies the difference to these values on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return self.title
+
+
+class UserStats(models.Model):
+    """ Summary of a user's recipes, kept current by core.stats """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    price_min = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    time_minutes_total = models.BigIntegerField(default=0)
+    time_minutes_min = models.IntegerField(null=True)
+    time_minutes_max = models.IntegerField(null=True)
+
+    class Meta:
+        verbose_name_plural = "user stats"
+
+    @property
+    def price_average(self):
+        if self.recipe_count:
+            return self.price_total / self.recipe_count
+        return None
+
+    @property
+    def time_minutes_average(self):
+        if self.recipe_count:
+            return self.time_minutes_total / self.recipe_count
+        return None
@@ -0,0 +1,76 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from core.cache import get_cache
+
+
+PIN_KEY = "db-primary-pin:{}"
+
+# request being handled by the current thread, set by
+# core.middleware.ReplicaRoutingMiddleware
+current_request = ContextVar("current_request", default=None)
+
+
+def pin_user_to_primary(user_id):
+    """ Sends reads of the user to the primary until replicas caught up
+    with the user's last write
+
+    The pin is kept in RESPONSE_CACHE_ALIAS, shared by all worker
+    processes in production, so a read after a write is routed the same
+    whichever worker handles it.
+    """
+    get_cache().set(
+        PIN_KEY.format(user_id), True, settings.READ_YOUR_WRITES_WINDOW
+    )
+
+
+def reads_from_replica(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return False
+    decision = getattr(request, "_reads_from_replica", None)
+    if decision is None:
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            # not authenticated yet, decide again once it is
+            return True
+        pinned = get_cache().get(PIN_KEY.format(user.pk))
+        decision = request._reads_from_replica = not pinned
+    return decision
+
+
+class ReplicaRouter:
+    """ Routes reads of safe requests to settings.REPLICA_DATABASES
+
+    Writes, reads outside of a request and reads of a user who wrote
+    within READ_YOUR_WRITES_WINDOW seconds go to the primary, as do
+    the models authentication depends on, so a token is usable right
+    after it was issued.
+    """
+
+    primary_models = {
+        "core.AuthToken",
+        settings.AUTH_USER_MODEL,
+        "sessions.Session",
+    }
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas or model._meta.label in self.primary_models:
+            return "default"
+        if reads_from_replica(current_request.get()):
+            return random.choice(replicas)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        # explicit, Django would otherwise write back to the database an
+        # instance was read from
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.REPLICA_DATABASES
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+from core.models import Recipe
+
+
+SEARCH_CONFIG = "english"
+
+# recipe title weighs more than names of its tags and ingredients
+UPDATE_VECTORS_SQL = """
+UPDATE core_recipe AS r SET search_vector =
+    setweight(to_tsvector(%(config)s, r.title), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(t.name, ' ') FROM core_tag t
+        JOIN core_recipe_tags rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(i.name, ' ') FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'B')
+WHERE r.id = ANY(%(ids)s)
+"""
+
+
+@contextmanager
+def coalesced_vector_updates():
+    """ Collects the vector rebuilds of the block into one UPDATE run
+    when it exits, like core.versions.coalesced_bumps """
+    if getattr(connection, "pending_vectors", None) is not None:
+        yield
+        return
+    connection.pending_vectors = pending = set()
+    try:
+        yield
+    finally:
+        connection.pending_vectors = None
+    _update_search_vectors(pending)
+
+
+def update_search_vectors(recipe_ids):
+    """ Rebuilds stored search vectors of the given recipes """
+    pending = getattr(connection, "pending_vectors", None)
+    if pending is not None:
+        pending.update(recipe_ids)
+        return
+    _update_search_vectors(recipe_ids)
+
+
+def _update_search_vectors(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPDATE_VECTORS_SQL, {"config": SEARCH_CONFIG, "ids": recipe_ids}
+        )
+
+
+def linked_recipe_ids(model, ids):
+    """ Returns ids of recipes linked to tags or ingredients """
+    field = next(
+        f for f in Recipe._meta.many_to_many if f.related_model is model
+    )
+    through = field.remote_field.through
+    return list(
+        through.objects.filter(
+            **{f"{field.m2m_reverse_field_name()}__in": list(ids)}
+        ).values_list("recipe_id", flat=True)
+    )
@@ -0,0 +1,28 @@
+import time
+
+
+class TimedSerializerMixin:
+    """ Adds time spent building representations to the serialize phase
+    of core.middleware.RequestMetricsMiddleware
+
+    Only the outermost call of a request is timed, nested and per item
+    calls of list serializers are inside it or add up, and SQL run from
+    it is left to the db phase.
+    """
+
+    def to_representation(self, instance):
+        request = getattr(self.context.get("request"), "_request", None)
+        stats = getattr(request, "_query_stats", None)
+        if stats is None or request._serializing:
+            return super().to_representation(instance)
+        request._serializing = True
+        db_duration = stats.duration
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            elapsed = time.perf_counter() - start
+            request._serialize_duration += elapsed - (
+                stats.duration - db_duration
+            )
+            request._serializing = False
@@ -0,0 +1,262 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import Signal, receiver
+
+from core.authentication import token_cache
+from core.cache import bump_user_version
+from core.db import check_idle_connection, mark_idle
+from core import stats
+from core.models import AuthToken, Tag, Ingredient, Recipe, UserStats
+from core.search import linked_recipe_ids, update_search_vectors
+from core.versions import bump_recipe_versions
+
+
+# Sent by bulk endpoints, which write with bulk_create/bulk_update and
+# m2m through rows directly, so neither post_save nor m2m_changed fire.
+# Arguments: sender (model), objs, created and for recipes relinked
+# ({model: ids of tags or ingredients that gained or lost a link}).
+bulk_saved = Signal()
+
+# Sent by SyncedQuerySet.soft_delete for every delete of recipes, tags
+# and ingredients. Arguments: sender (model), objs, unlinked ({model:
+# ids of the objects the deleted rows were linked to}).
+bulk_deleted = Signal()
+
+
+@receiver(request_started)
+def check_idle_connections(sender, **kwargs):
+    for connection in connections.all():
+        check_idle_connection(connection)
+
+
+@receiver(request_finished)
+def mark_connections_idle(sender, **kwargs):
+    for connection in connections.all():
+        mark_idle(connection)
+
+
+@receiver(post_delete, sender=AuthToken)
+def drop_deleted_token(sender, instance, **kwargs):
+    """ Removes deleted token from the auth cache """
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def drop_user_tokens(sender, instance, created, **kwargs):
+    """ Password or is_active changes must not be served from cache """
+    if not created:
+        token_cache.delete_user(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def bump_data_version(sender, instance, **kwargs):
+    """ Invalidates cached list responses of the owner """
+    bump_user_version(instance.user_id)
+
+
+@receiver(bulk_saved, sender=Tag)
+@receiver(bulk_saved, sender=Ingredient)
+@receiver(bulk_saved, sender=Recipe)
+@receiver(bulk_deleted, sender=Tag)
+@receiver(bulk_deleted, sender=Ingredient)
+@receiver(bulk_deleted, sender=Recipe)
+def bump_data_version_bulk(sender, objs, **kwargs):
+    for user_id in {obj.user_id for obj in objs}:
+        bump_user_version(user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_data_version_m2m(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_user_version(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_vector(sender, instance, **kwargs):
+    update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_renamed_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(linked_recipe_ids(sender, [instance.pk]))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_linked_recipes(sender, instance, **kwargs):
+    # m2m rows are gone by post_delete, collect affected recipes first
+    instance._linked_recipe_ids = linked_recipe_ids(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_unlinked_vectors(sender, instance, **kwargs):
+    update_search_vectors(getattr(instance, "_linked_recipe_ids", ()))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_relinked_vectors(sender, instance, action, reverse, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_search_vectors([instance.pk])
+    elif action == "pre_clear":
+        remember_linked_recipes(type(instance), instance)
+    elif action in ("post_add", "post_remove"):
+        update_search_vectors(kwargs["pk_set"])
+    elif action == "post_clear":
+        update_unlinked_vectors(type(instance), instance)
+
+
+@receiver(bulk_saved, sender=Recipe)
+def update_bulk_recipe_vectors(sender, objs, **kwargs):
+    update_search_vectors(obj.pk for obj in objs)
+
+
+@receiver(bulk_saved, sender=Tag)
+@receiver(bulk_saved, sender=Ingredient)
+def update_bulk_renamed_vectors(sender, objs, created, **kwargs):
+    if not created:
+        ids = [obj.pk for obj in objs]
+        update_search_vectors(linked_recipe_ids(sender, ids))
+
+
+@receiver(post_save, sender=get_user_model())
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, **kwargs):
+    stats.recipes_saved([instance], created)
+
+
+@receiver(bulk_saved, sender=Recipe)
+def count_bulk_recipes(sender, objs, created, relinked=None, **kwargs):
+    stats.recipes_saved(objs, created)
+    for model, ids in (relinked or {}).items():
+        stats.refresh_usage_counts(model, ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_linked_objects(sender, instance, **kwargs):
+    # m2m rows are gone by post_delete, collect used tags first
+    instance._linked_ids = stats.linked_ids([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    stats.recipes_deleted([instance])
+    for model, ids in getattr(instance, "_linked_ids", {}).items():
+        stats.refresh_usage_counts(model, ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def count_saved_object(sender, instance, created, **kwargs):
+    if created:
+        stats.count_objects(sender, [instance.user_id], 1)
+
+
+@receiver(bulk_saved, sender=Tag)
+@receiver(bulk_saved, sender=Ingredient)
+def count_bulk_objects(sender, objs, created, **kwargs):
+    if created:
+        stats.count_objects(sender, [obj.user_id for obj in objs], 1)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def count_deleted_object(sender, instance, **kwargs):
+    stats.count_objects(sender, [instance.user_id], -1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_links(sender, instance, action, reverse, model, **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            stats.refresh_usage_counts(type(instance), [instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_ids = stats.linked_ids([instance.pk])[model]
+    elif action in ("post_add", "post_remove"):
+        stats.refresh_usage_counts(model, kwargs["pk_set"])
+    elif action == "post_clear":
+        stats.refresh_usage_counts(
+            model, getattr(instance, "_cleared_ids", ())
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_relinked_versions(sender, instance, action, reverse, **kwargs):
+    """ Link changes are recipe changes for sync and conditional GETs """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        bump_recipe_versions([instance.pk], [instance])
+    elif action == "post_clear":
+        # collected on pre_clear by remember_linked_recipes
+        bump_recipe_versions(getattr(instance, "_linked_recipe_ids", ()))
+    else:
+        bump_recipe_versions(kwargs["pk_set"])
+
+
+@receiver(post_save, sender=Recipe)
+def bump_saved_version(sender, instance, created, **kwargs):
+    if not created:
+        bump_recipe_versions([instance.pk], [instance])
+
+
+@receiver(bulk_saved, sender=Recipe)
+def bump_bulk_versions(sender, objs, created, **kwargs):
+    if not created:
+        bump_recipe_versions([obj.pk for obj in objs], objs)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def bump_renamed_versions(sender, instance, created, **kwargs):
+    # detail responses nest the names
+    if not created:
+        bump_recipe_versions(linked_recipe_ids(sender, [instance.pk]))
+
+
+@receiver(bulk_saved, sender=Tag)
+@receiver(bulk_saved, sender=Ingredient)
+def bump_bulk_renamed_versions(sender, objs, created, **kwargs):
+    if not created:
+        ids = [obj.pk for obj in objs]
+        bump_recipe_versions(linked_recipe_ids(sender, ids))
+
+
+@receiver(bulk_deleted, sender=Recipe)
+def count_deleted_recipes(sender, objs, unlinked, **kwargs):
+    stats.recipes_deleted(objs)
+    for model, ids in unlinked.items():
+        stats.refresh_usage_counts(model, ids)
+
+
+@receiver(bulk_deleted, sender=Tag)
+@receiver(bulk_deleted, sender=Ingredient)
+def unlink_deleted_objects(sender, objs, unlinked, **kwargs):
+    """ Recipes that lost a tag or ingredient changed """
+    stats.count_objects(sender, [obj.user_id for obj in objs], -1)
+    update_search_vectors(unlinked[Recipe])
+    bump_recipe_versions(unlinked[Recipe])
@@ -0,0 +1,236 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, F
+
+from core.models import Recipe, UserStats
+
+
+# recomputes summaries of the given users from scratch, soft deleted
+# rows do not count
+REBUILD_STATS_SQL = """
+INSERT INTO core_userstats (
+    user_id, recipe_count, tag_count, ingredient_count,
+    price_total, price_min, price_max,
+    time_minutes_total, time_minutes_min, time_minutes_max
+)
+SELECT u.id, coalesce(r.count, 0),
+    (
+        SELECT COUNT(*) FROM core_tag t
+        WHERE t.user_id = u.id AND t.deleted_at IS NULL
+    ),
+    (
+        SELECT COUNT(*) FROM core_ingredient i
+        WHERE i.user_id = u.id AND i.deleted_at IS NULL
+    ),
+    coalesce(r.price_total, 0), r.price_min, r.price_max,
+    coalesce(r.time_minutes_total, 0), r.time_minutes_min,
+    r.time_minutes_max
+FROM core_usermodel u LEFT JOIN (
+    SELECT user_id, COUNT(*) AS count,
+        SUM(price) AS price_total, MIN(price) AS price_min,
+        MAX(price) AS price_max, SUM(time_minutes) AS time_minutes_total,
+        MIN(time_minutes) AS time_minutes_min,
+        MAX(time_minutes) AS time_minutes_max
+    FROM core_recipe
+    WHERE user_id = ANY(%(ids)s) AND deleted_at IS NULL
+    GROUP BY user_id
+) r ON r.user_id = u.id
+WHERE u.id = ANY(%(ids)s)
+ON CONFLICT (user_id) DO UPDATE SET
+    recipe_count = EXCLUDED.recipe_count,
+    tag_count = EXCLUDED.tag_count,
+    ingredient_count = EXCLUDED.ingredient_count,
+    price_total = EXCLUDED.price_total,
+    price_min = EXCLUDED.price_min,
+    price_max = EXCLUDED.price_max,
+    time_minutes_total = EXCLUDED.time_minutes_total,
+    time_minutes_min = EXCLUDED.time_minutes_min,
+    time_minutes_max = EXCLUDED.time_minutes_max
+"""
+
+# LEAST and GREATEST skip NULLs, so no added recipes leaves them as is
+APPLY_RECIPES_SQL = """
+UPDATE core_userstats SET
+    recipe_count = recipe_count + %(count)s,
+    price_total = price_total + %(price_total)s,
+    price_min = LEAST(price_min, %(price_min)s),
+    price_max = GREATEST(price_max, %(price_max)s),
+    time_minutes_total = time_minutes_total + %(time_minutes_total)s,
+    time_minutes_min = LEAST(time_minutes_min, %(time_minutes_min)s),
+    time_minutes_max = GREATEST(time_minutes_max, %(time_minutes_max)s)
+WHERE user_id = %(user_id)s
+"""
+
+# a removed value may have been the extreme, min and max are looked up
+# again on the (user, price) and (user, time_minutes) indexes
+RESET_EXTREMES_SQL = """
+UPDATE core_userstats AS s SET
+    price_min = r.price_min,
+    price_max = r.price_max,
+    time_minutes_min = r.time_minutes_min,
+    time_minutes_max = r.time_minutes_max
+FROM (
+    SELECT MIN(price) AS price_min, MAX(price) AS price_max,
+        MIN(time_minutes) AS time_minutes_min,
+        MAX(time_minutes) AS time_minutes_max
+    FROM core_recipe WHERE user_id = %(id)s AND deleted_at IS NULL
+) AS r
+WHERE s.user_id = %(id)s
+"""
+
+REFRESH_USAGE_SQL = """
+UPDATE {table} AS t SET recipe_count = (
+    SELECT COUNT(*) FROM {through} l WHERE l.{target} = t.{pk}
+)
+WHERE t.{column} = ANY(%(ids)s)
+"""
+
+STATS_FIELDS = ("price", "time_minutes")
+
+
+def rebuild_user_stats(user_ids):
+    """ Recomputes summaries and tag and ingredient usage of users """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_STATS_SQL, {"ids": user_ids})
+    for field in Recipe._meta.many_to_many:
+        refresh_usage_counts(field.related_model, user_ids, "user_id")
+
+
+def get_user_stats(user_id):
+    """ Returns the user's summary, built on first use """
+    try:
+        return UserStats.objects.get(user_id=user_id)
+    except UserStats.DoesNotExist:
+        rebuild_user_stats([user_id])
+        # replicas may not have the new row yet
+        return UserStats.objects.using("default").get(user_id=user_id)
+
+
+def refresh_usage_counts(model, ids, column="id"):
+    """ Recounts linked recipes of tags or ingredients by id or owner """
+    ids = list(ids)
+    if not ids:
+        return
+    field = next(
+        f for f in Recipe._meta.many_to_many if f.related_model is model
+    )
+    through = field.remote_field.through._meta
+    target = through.get_field(field.m2m_reverse_field_name())
+    quote = connection.ops.quote_name
+    sql = REFRESH_USAGE_SQL.format(
+        table=quote(model._meta.db_table),
+        through=quote(through.db_table),
+        target=quote(target.column),
+        pk=quote(model._meta.pk.column),
+        column=quote(column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"ids": ids})
+
+
+def loaded_values(recipe):
+    """ Returns the (price, time_minutes) a recipe was loaded with """
+    loaded = getattr(recipe, "_loaded_values", {})
+    if any(field not in loaded for field in STATS_FIELDS):
+        return None
+    return tuple(loaded[field] for field in STATS_FIELDS)
+
+
+def current_values(recipe):
+    """ Returns (price, time_minutes) of a recipe as the database stores
+    them, attributes may still hold the float or string it was given """
+    values = []
+    for name in STATS_FIELDS:
+        field = Recipe._meta.get_field(name)
+        value = field.to_python(getattr(recipe, name))
+        if isinstance(field, DecimalField):
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        values.append(value)
+    return tuple(values)
+
+
+def apply_recipe_changes(user_id, added=(), removed=()):
+    """ Adds and subtracts (price, time_minutes) pairs of recipes to the
+    user's summary without reading the recipes again """
+    added = list(added)
+    removed = list(removed)
+    if not added and not removed:
+        return
+    params = {"user_id": user_id, "count": len(added) - len(removed)}
+    for i, field in enumerate(STATS_FIELDS):
+        new = [values[i] for values in added]
+        old = [values[i] for values in removed]
+        params[f"{field}_total"] = sum(new) - sum(old)
+        params[f"{field}_min"] = min(new, default=None)
+        params[f"{field}_max"] = max(new, default=None)
+    with connection.cursor() as cursor:
+        cursor.execute(APPLY_RECIPES_SQL, params)
+        if removed:
+            cursor.execute(RESET_EXTREMES_SQL, {"id": user_id})
+
+
+def recipes_saved(recipes, created):
+    """ Applies created or updated recipes to their owners' summaries """
+    added = defaultdict(list)
+    removed = defaultdict(list)
+    stale_users = set()
+    for recipe in recipes:
+        old = None if created else loaded_values(recipe)
+        if not created and old is None:
+            # values before the save are unknown
+            stale_users.add(recipe.user_id)
+            continue
+        new = current_values(recipe)
+        if old != new:
+            added[recipe.user_id].append(new)
+            if old is not None:
+                removed[recipe.user_id].append(old)
+        # the next save of this instance starts from the saved values
+        recipe._loaded_values = {
+            **getattr(recipe, "_loaded_values", {}),
+            **dict(zip(STATS_FIELDS, new)),
+        }
+    for user_id in set(added) - stale_users:
+        apply_recipe_changes(user_id, added[user_id], removed[user_id])
+    rebuild_user_stats(stale_users)
+
+
+def recipes_deleted(recipes):
+    """ Removes deleted recipes from their owners' summaries """
+    removed = defaultdict(list)
+    for recipe in recipes:
+        values = loaded_values(recipe) or current_values(recipe)
+        removed[recipe.user_id].append(values)
+    for user_id, values in removed.items():
+        apply_recipe_changes(user_id, removed=values)
+
+
+def linked_ids(recipe_ids):
+    """ Returns {model: ids} of tags and ingredients linked to recipes """
+    linked = {}
+    for field in Recipe._meta.many_to_many:
+        through = field.remote_field.through
+        target = f"{field.m2m_reverse_field_name()}_id"
+        linked[field.related_model] = list(
+            through.objects.filter(recipe_id__in=list(recipe_ids))
+            .values_list(target, flat=True)
+            .distinct()
+        )
+    return linked
+
+
+def count_objects(model, user_ids, delta):
+    """ Adds delta to the tag or ingredient count of each user """
+    column = f"{model._meta.model_name}_count"
+    counts = defaultdict(int)
+    for user_id in user_ids:
+        counts[user_id] += delta
+    for user_id, change in counts.items():
+        UserStats.objects.filter(user_id=user_id).update(
+            **{column: F(column) + change}
+        )
@@ -0,0 +1,51 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix="background",
+        )
+    return _executor
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        connection.close()
+
+
+def run_in_background(func, *args):
+    """ Runs func in the in-process worker pool once the current
+    transaction commits, so the worker sees the saved rows.
+
+    The queue lives in memory, tasks still pending when the process
+    exits are lost and have to be re-enqueued.
+    """
+    if not settings.BACKGROUND_TASKS_ASYNC:
+        func(*args)
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, func, args))
+
+
+def wait_for_background_tasks():
+    """ Blocks until queued tasks are done, a later task starts a new
+    worker pool """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
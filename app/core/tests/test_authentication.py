@@ -0,0 +1,157 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.authentication import (
+    CachedTokenAuthentication,
+    ConcurrencyLimiter,
+    CredentialChecksBusy,
+    LRUCache,
+    token_cache,
+)
+from core.models import AuthToken
+
+
+TAGS_URL = reverse("recipe:tag-list")
+ME_URL = reverse("user:me")
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    @patch("time.monotonic")
+    def test_entries_expire(self, monotonic):
+        cache = LRUCache(max_size=2, ttl=60)
+        monotonic.return_value = 100
+        cache.set("a", 1)
+        monotonic.return_value = 159
+        self.assertEqual(cache.get("a"), 1)
+        monotonic.return_value = 160
+        self.assertIsNone(cache.get("a"))
+
+
+class ConcurrencyLimiterTests(TestCase):
+    def test_slots_are_released(self):
+        limiter = ConcurrencyLimiter(max_concurrent=1, timeout=0.01)
+        with limiter.slot():
+            with self.assertRaises(CredentialChecksBusy):
+                with limiter.slot():
+                    pass
+        with limiter.slot():
+            pass
+
+    def test_slot_released_on_error(self):
+        limiter = ConcurrencyLimiter(max_concurrent=1, timeout=0.01)
+        with self.assertRaises(ValueError):
+            with limiter.slot():
+                raise ValueError
+        with limiter.slot():
+            pass
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.local.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tearDown(self):
+        token_cache.local.clear()
+
+    def test_token_lookup_cached(self):
+        self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(TAGS_URL)
+        self.token.delete()
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_rejected(self):
+        self.client.get(TAGS_URL)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_entry(self):
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {"password": "newsecret"})
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    def test_cached_user_not_shared(self):
+        """ Tests that each request gets own copy of cached user """
+        auth = CachedTokenAuthentication()
+        user1, token1 = auth.authenticate_credentials(self.token.key)
+        user2, token2 = auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user1, user2)
+        self.assertIsNot(user1, user2)
+        self.assertIs(token2.user, user2)
+
+
+class TokenExpiryTests(TestCase):
+    def setUp(self):
+        token_cache.local.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        token_cache.local.clear()
+
+    def token_used(self, seconds_ago, age=0):
+        now = timezone.now()
+        token = AuthToken.objects.create(
+            user=self.user,
+            created=now - timedelta(seconds=max(age, seconds_ago)),
+            last_used=now - timedelta(seconds=seconds_ago),
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return token
+
+    def test_idle_token_rejected(self):
+        self.token_used(settings.AUTH_TOKEN["idle_timeout"] + 1)
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_old_token_rejected(self):
+        self.token_used(0, age=settings.AUTH_TOKEN["max_age"] + 1)
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_used_write_throttled(self):
+        token = self.token_used(10)
+        last_used = token.last_used
+        self.client.get(ME_URL)
+        token.refresh_from_db()
+        self.assertEqual(token.last_used, last_used)
+
+    def test_use_extends_lifetime(self):
+        token = self.token_used(settings.AUTH_TOKEN["touch_interval"] + 1)
+        last_used = token.last_used
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        token.refresh_from_db()
+        self.assertGreater(token.last_used, last_used)
+        self.assertFalse(token_cache.get(token.key)[1].touch())
@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase, override_settings
+from core.checks import (
+    check_debug_in_production,
+    check_shared_response_cache,
+)
+
+
+class ChecksTests(SimpleTestCase):
+    @override_settings(PRODUCTION=True, DEBUG=True)
+    def test_debug_in_production_fails(self):
+        errors = check_debug_in_production(None)
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+
+    @override_settings(PRODUCTION=True, DEBUG=False)
+    def test_production_without_debug_passes(self):
+        self.assertEqual(check_debug_in_production(None), [])
+
+    @override_settings(PRODUCTION=False, DEBUG=True)
+    def test_debug_in_development_passes(self):
+        self.assertEqual(check_debug_in_production(None), [])
+
+    @override_settings(PRODUCTION=True)
+    def test_local_cache_in_production_fails(self):
+        errors = check_shared_response_cache(None)
+        self.assertEqual([error.id for error in errors], ["core.E002"])
+
+    @override_settings(
+        PRODUCTION=True,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"
+            }
+        },
+    )
+    def test_shared_cache_in_production_passes(self):
+        self.assertEqual(check_shared_response_cache(None), [])
+
+    @override_settings(PRODUCTION=False)
+    def test_local_cache_in_development_passes(self):
+        self.assertEqual(check_shared_response_cache(None), [])
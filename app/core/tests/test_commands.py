@@ -1,21 +1,141 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+from core.cache import get_cache
+from core.models import AuthToken
 
 
 class CommandsTests(TestCase):
     def test_wait_for_db_ready(self):
         """ testing of db is ready """
         with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.return_value = True
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 1)
+            call_command("wait_for_db", stdout=StringIO())
+            self.assertEqual(gi.return_value.ensure_connection.call_count, 1)
 
     @patch("time.sleep", return_value=True)
     def test_wait_for_db(self, ts):
-        """ testing waiting for db """
+        """ testing waiting for db with growing pauses """
         with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+            ensure = gi.return_value.ensure_connection
+            ensure.side_effect = [OperationalError] * 5 + [None]
+            call_command("wait_for_db", stdout=StringIO())
+            self.assertEqual(ensure.call_count, 6)
+            self.assertEqual(
+                [c.args[0] for c in ts.call_args_list], [0.5, 1, 2, 4, 8]
+            )
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
+            gi.return_value.ensure_connection.side_effect = OperationalError
+            with self.assertRaises(CommandError):
+                call_command("wait_for_db", timeout=0, stdout=StringIO())
+
+    def test_explain_queries(self):
+        """ testing query plans are printed for viewset queries """
+        get_user_model().objects.create_user("test@test.com", "secret")
+        out = StringIO()
+        call_command("explain_queries", stdout=out)
+        self.assertIn("== tags assigned_only: next page", out.getvalue())
+        self.assertIn("== recipes by all tags: first page", out.getvalue())
+
+    def test_explain_queries_no_user(self):
+        with self.assertRaises(CommandError):
+            call_command("explain_queries", stdout=StringIO())
+
+    def test_bench_logins(self):
+        out = StringIO()
+        call_command(
+            "bench_logins", logins=1, hashers=["argon2"], stdout=out
+        )
+        self.assertIn("verify argon2", out.getvalue())
+        self.assertIn("logins/s per core", out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_bench_logins_reruns(self):
+        options = {"logins": 1, "hashers": ["argon2"], "stdout": StringIO()}
+        with patch("core.models.UserModel.delete"):
+            call_command("bench_logins", **options)
+        call_command("bench_logins", **options)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_bench_assigned_only_reruns(self):
+        """ testing a run killed before cleanup does not break the next """
+        options = {"recipes": 3, "tags": 2, "repeat": 1, "stdout": StringIO()}
+        with patch("core.models.UserModel.delete"):
+            call_command("bench_assigned_only", **options)
+        out = StringIO()
+        call_command("bench_assigned_only", **{**options, "stdout": out})
+        self.assertIn("exists: rows=", out.getvalue())
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_bench_api_leaves_shared_state(self):
+        """ testing reruns after a killed run and a cache shared with
+        live workers """
+        get_cache().set("live-worker-key", 1)
+        self.addCleanup(get_cache().delete, "live-worker-key")
+        options = {"users": 1, "recipes": 2, "tags": 1, "ingredients": 1}
+        options.update(repeat=1, stdout=StringIO())
+        with patch("core.models.UserModel.delete"):
+            call_command("bench_api", **options)
+        call_command("bench_api", **options)
+        self.assertEqual(get_cache().get("live-worker-key"), 1)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_purge_tokens(self):
+        user = get_user_model().objects.create_user("test@test.com", "secret")
+        stale = timezone.now() - timedelta(
+            seconds=settings.AUTH_TOKEN["idle_timeout"] + 1
+        )
+        for _ in range(3):
+            AuthToken.objects.create(user=user, last_used=stale)
+        fresh = AuthToken.objects.create(user=user)
+        out = StringIO()
+        call_command("purge_tokens", batch_size=2, stdout=out)
+        self.assertIn("Purged 3 tokens", out.getvalue())
+        self.assertEqual(list(AuthToken.objects.all()), [fresh])
+
+    def test_bench_api(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "bench.json")
+            call_command(
+                "bench_api",
+                users=1,
+                recipes=5,
+                tags=3,
+                ingredients=3,
+                repeat=1,
+                output=output,
+                stdout=StringIO(),
+            )
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(report["meta"]["recipes"], 5)
+            result = report["results"]["recipe detail"]
+            self.assertEqual(result["queries"], 3)
+            self.assertGreater(result["alloc_peak_kib"], 0)
+            self.assertFalse(get_user_model().objects.exists())
+
+            for result in report["results"].values():
+                result["p50_ms"] /= 1000
+            with open(output, "w") as file:
+                json.dump(report, file)
+            with self.assertRaisesRegex(CommandError, "Regressions"):
+                call_command(
+                    "bench_api",
+                    users=1,
+                    recipes=5,
+                    repeat=1,
+                    baseline=output,
+                    stdout=StringIO(),
+                )
@@ -0,0 +1,98 @@
+import time
+from unittest.mock import Mock
+from django.test import SimpleTestCase, override_settings
+from psycopg2 import OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS,
+)
+from core.backends.pooled.base import ConnectionPool
+from core.db import check_idle_connection
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.broken = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        if self.broken:
+            raise OperationalError("server closed the connection")
+        return Mock()
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        self.connect = Mock(side_effect=lambda: FakeConnection())
+        return ConnectionPool(self.connect, alias="default", **kwargs)
+
+    def test_connections_reused(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.get()
+        pool.put(first)
+        self.assertIs(pool.get(), first)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual(pool.stats(), (0, 1))
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.get()
+        with self.assertRaises(OperationalError):
+            pool.get()
+
+    def test_open_transaction_rolled_back(self):
+        pool = self.make_pool()
+        connection = pool.get()
+        connection.status = TRANSACTION_STATUS_INTRANS
+        pool.put(connection)
+        self.assertEqual(connection.status, TRANSACTION_STATUS_IDLE)
+        self.assertEqual(pool.stats(), (1, 0))
+
+    def test_closed_connection_frees_slot(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        connection = pool.get()
+        connection.close()
+        pool.put(connection)
+        self.assertEqual(pool.stats(), (0, 0))
+        self.assertIsNot(pool.get(), connection)
+
+    def test_broken_idle_connection_replaced(self):
+        pool = self.make_pool(health_check_after=0)
+        connection = pool.get()
+        pool.put(connection)
+        connection.broken = True
+        replacement = pool.get()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats(), (0, 1))
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        self.connect.side_effect = OperationalError
+        with self.assertRaises(OperationalError):
+            pool.get()
+        self.assertEqual(pool.stats(), (0, 0))
+
+
+@override_settings(DB_HEALTH_CHECK_AFTER=30)
+class IdleConnectionCheckTests(SimpleTestCase):
+    def test_dead_idle_connection_closed(self):
+        connection = Mock(idle_since=time.monotonic() - 60)
+        connection.is_usable.return_value = False
+        check_idle_connection(connection)
+        connection.close.assert_called_once_with()
+
+    def test_recent_connection_not_checked(self):
+        connection = Mock(idle_since=time.monotonic())
+        check_idle_connection(connection)
+        connection.is_usable.assert_not_called()
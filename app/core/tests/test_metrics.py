@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.metrics import Counter, Gauge, Histogram, Registry
+
+
+TAGS_URL = reverse("recipe:tag-list")
+METRICS_URL = reverse("metrics")
+
+
+class MetricTypesTests(TestCase):
+    def test_histogram_buckets_cumulative(self):
+        histogram = Histogram("latency", "doc", ("route",), buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value, "a")
+        self.assertEqual(
+            list(histogram.samples()),
+            [
+                'latency_bucket{route="a",le="1"} 2',
+                'latency_bucket{route="a",le="5"} 3',
+                'latency_bucket{route="a",le="+Inf"} 4',
+                'latency_sum{route="a"} 14.5',
+                'latency_count{route="a"} 4',
+            ],
+        )
+
+    def test_label_values_escaped(self):
+        counter = Counter("hits", "doc", ("path",))
+        counter.inc('a"b\\c')
+        counter.inc('a"b\\c', amount=2)
+        self.assertEqual(list(counter.samples()), [r'hits{path="a\"b\\c"} 3'])
+
+
+class SharedRegistryTests(TestCase):
+    """ Snapshots of other worker processes in METRICS_DIR """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.registry = Registry()
+        self.counter = self.registry.register(Counter("hits", "doc"))
+        self.histogram = self.registry.register(
+            Histogram("latency", "doc", buckets=(1,))
+        )
+        self.gauge = self.registry.register(
+            Gauge("open", "doc", (), lambda: {(): 1})
+        )
+
+    def write_snapshot(self, pid, values):
+        kinds = {metric.name: metric.kind for metric in self.registry.metrics}
+        snapshot = {
+            name: {"kind": kinds[name], "values": entries}
+            for name, entries in values.items()
+        }
+        path = os.path.join(self.directory, f"{pid}.json")
+        with open(path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+
+    def test_flush_writes_own_values(self):
+        self.counter.inc(amount=2)
+        self.registry.flush()
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        self.assertEqual(snapshot["hits"]["values"], [[[], 2]])
+
+    def test_render_sums_processes(self):
+        self.counter.inc(amount=2)
+        self.histogram.observe(0.5)
+        # the parent process stands in for a live worker
+        self.write_snapshot(
+            os.getppid(),
+            {"hits": [[[], 3]], "latency": [[[], [[0, 1], 2.0]]]},
+        )
+
+        body = self.registry.render()
+
+        self.assertIn("hits 5", body)
+        self.assertIn('latency_bucket{le="1"} 1', body)
+        self.assertIn('latency_bucket{le="+Inf"} 2', body)
+        self.assertIn("latency_sum 2.5", body)
+
+    def test_exited_process_keeps_counters_only(self):
+        pid = 2 ** 22 + 1  # above pid_max, never a live process
+        self.write_snapshot(pid, {"hits": [[[], 3]], "open": [[[], 4]]})
+
+        collected = self.registry.collect()
+
+        self.assertEqual(collected["hits"], {(): 3})
+        self.assertEqual(collected["open"], {(): 1})
+
+    def test_exited_snapshots_folded(self):
+        """ testing recycled workers leave one file and counters never
+        go back when a pid is reused """
+        pid = 2 ** 22 + 1
+        self.write_snapshot(pid, {"hits": [[[], 3]], "open": [[[], 4]]})
+        self.write_snapshot(pid + 1, {"hits": [[[], 2]]})
+        self.assertEqual(self.registry.collect()["hits"], {(): 5})
+
+        self.write_snapshot(pid, {"hits": [[[], 1]]})
+        self.assertEqual(self.registry.collect()["hits"], {(): 6})
+        self.assertEqual(self.registry.collect()["open"], {(): 1})
+        self.assertEqual(
+            sorted(
+                name
+                for name in os.listdir(self.directory)
+                if name.endswith(".json")
+            ),
+            ["exited.json"],
+        )
+
+    def test_fold_by_process_without_metrics(self):
+        """ testing the gunicorn master folds metrics it never imported """
+        pid = 2 ** 22 + 1
+        self.write_snapshot(pid, {"hits": [[[], 3]], "open": [[[], 4]]})
+
+        Registry().fold(pid)
+
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, f"{pid}.json"))
+        )
+        collected = self.registry.collect()
+        self.assertEqual(collected["hits"], {(): 3})
+        self.assertEqual(collected["open"], {(): 1})
+
+
+@override_settings(METRICS_TOKEN="secret")
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def get_metrics(self):
+        return self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+
+    def test_server_timing_header(self):
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res["Server-Timing"]
+        for name in ("db;", "serialize;", "render;", "app;", "total;"):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_serializer_time_measured(self):
+        self.client.post(TAGS_URL, {"name": "qwe"})
+        res = self.client.get(TAGS_URL)
+        self.assertRegex(res["Server-Timing"], r"serialize;dur=\d+\.\d+")
+        self.assertNotIn("serialize;dur=0.00", res["Server-Timing"])
+        body = self.get_metrics().content.decode()
+        self.assertIn(
+            'http_request_serialize_seconds_count{route="recipe:tag-list",'
+            'method="GET"}',
+            body,
+        )
+
+    def test_metrics_labeled_by_route(self):
+        self.client.get(TAGS_URL)
+        res = self.get_metrics()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        body = res.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn(
+            'http_request_duration_seconds_count{route="recipe:tag-list",'
+            'method="GET"}',
+            body,
+        )
+        self.assertIn(
+            'http_requests_total{route="recipe:tag-list",method="GET",'
+            'status="200"}',
+            body,
+        )
+
+    def test_unmatched_route_label(self):
+        self.client.get("/no-such-page/")
+        body = self.get_metrics().content.decode()
+        self.assertIn('route="<unmatched>"', body)
+
+    def test_metrics_token_required(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = self.get_metrics()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_denied_without_token(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,94 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.cache import get_cache
+from core.models import AuthToken, Tag
+from core.routers import (
+    PIN_KEY,
+    ReplicaRouter,
+    current_request,
+    pin_user_to_primary,
+)
+
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+@override_settings(REPLICA_DATABASES=["replica_0"])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        get_cache().delete(PIN_KEY.format(self.user.pk))
+
+    def route_read(self, method, model=Tag, user=None):
+        request = getattr(RequestFactory(), method)("/")
+        request.user = user or self.user
+        token = current_request.set(request)
+        try:
+            return self.router.db_for_read(model)
+        finally:
+            current_request.reset(token)
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route_read("get"), "replica_0")
+        self.assertEqual(self.route_read("post"), "default")
+
+    def test_pinned_user_reads_from_primary(self):
+        pin_user_to_primary(self.user.pk)
+        self.assertEqual(self.route_read("get"), "default")
+
+    def test_auth_models_read_from_primary(self):
+        self.assertEqual(self.route_read("get", AuthToken), "default")
+        self.assertEqual(self.route_read("get", get_user_model()), "default")
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Tag), "default")
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Tag), "default")
+        self.assertFalse(self.router.allow_migrate("replica_0", "core"))
+
+    def test_pin_seen_by_other_workers(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        backend = "django.core.cache.backends.filebased.FileBasedCache"
+        caches = {
+            alias: {"BACKEND": backend, "LOCATION": location.name}
+            for alias in ("default", "worker_a", "worker_b")
+        }
+        with override_settings(CACHES=caches):
+            with override_settings(RESPONSE_CACHE_ALIAS="worker_a"):
+                pin_user_to_primary(self.user.pk)
+            with override_settings(RESPONSE_CACHE_ALIAS="worker_b"):
+                self.assertEqual(self.route_read("get"), "default")
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.route_read("get"), "default")
+
+
+class ReplicaRoutingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.key = PIN_KEY.format(self.user.pk)
+        get_cache().delete(self.key)
+
+    def test_write_pins_user(self):
+        res = self.client.post(TAGS_URL, {"name": "qwe"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(get_cache().get(self.key))
+
+    def test_read_does_not_pin(self):
+        self.client.get(TAGS_URL)
+        self.assertIsNone(get_cache().get(self.key))
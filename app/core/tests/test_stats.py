@@ -0,0 +1,180 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.forms.models import model_to_dict
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag, UserStats
+from core.stats import get_user_stats, rebuild_user_stats
+
+
+STATS_URL = reverse("recipe:stats")
+RECIPE_URL = reverse("recipe:recipe-list")
+RECIPE_BULK_URL = reverse("recipe:recipe-bulk")
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def snapshot(self):
+        """ Returns summary and usage counts as currently stored """
+        return (
+            model_to_dict(UserStats.objects.get(user=self.user)),
+            dict(Tag.objects.values_list("name", "recipe_count")),
+            dict(Ingredient.objects.values_list("name", "recipe_count")),
+        )
+
+    def assertStatsCurrent(self):
+        kept = self.snapshot()
+        rebuild_user_stats([self.user.pk])
+        self.assertEqual(kept, self.snapshot())
+
+    def test_created_with_user(self):
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertIsNone(stats.price_min)
+
+    def test_kept_current_on_writes(self):
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=10, price=4.5
+        )
+        recipe.tags.add(tag)
+        self.assertStatsCurrent()
+
+        res = self.client.post(
+            RECIPE_URL,
+            {
+                "title": "asd",
+                "time_minutes": 30,
+                "price": "12.00",
+                "tag_names": ["vegan", "quick"],
+                "ingredient_names": ["tea"],
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertStatsCurrent()
+
+        recipe.refresh_from_db()
+        recipe.price = Decimal("1.00")
+        recipe.save()
+        recipe.price = Decimal("2.00")
+        recipe.save()
+        self.assertStatsCurrent()
+
+        self.client.patch(
+            reverse("recipe:recipe-detail", args=[res.data["id"]]),
+            {"tags": []},
+            format="json",
+        )
+        self.assertStatsCurrent()
+
+        recipe.tags.clear()
+        tag.recipe_set.add(recipe)
+        self.assertStatsCurrent()
+
+        recipe.delete()
+        tag.delete()
+        self.assertStatsCurrent()
+        self.assertEqual(get_user_stats(self.user.pk).recipe_count, 1)
+
+    def test_kept_current_on_bulk_writes(self):
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        items = [
+            {"title": f"r{i}", "time_minutes": i, "price": "3.00"}
+            for i in range(1, 4)
+        ]
+        res = self.client.post(RECIPE_BULK_URL, items, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ids = [item["id"] for item in res.data]
+        self.client.patch(
+            RECIPE_BULK_URL,
+            [{"id": ids[0], "price": "9.99", "tags": [tag.id]}],
+            format="json",
+        )
+        self.assertStatsCurrent()
+
+        self.client.delete(RECIPE_BULK_URL, ids[:2], format="json")
+        self.assertStatsCurrent()
+
+    def test_bulk_writes_recount_relinked_only(self):
+        old, new, other = (
+            Tag.objects.create(user=self.user, name=name)
+            for name in ("old", "new", "other")
+        )
+        recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=10, price=4.5
+        )
+        recipe.tags.add(old, other)
+        # a recount of untouched tags would fix this
+        Tag.objects.filter(pk=other.pk).update(recipe_count=7)
+
+        res = self.client.patch(
+            RECIPE_BULK_URL,
+            [{"id": recipe.id, "tags": [new.id, other.id]}],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = dict(Tag.objects.values_list("name", "recipe_count"))
+        self.assertEqual(counts, {"old": 0, "new": 1, "other": 7})
+
+    def test_missing_summary_rebuilt_on_read(self):
+        Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=10, price=4
+        )
+        UserStats.objects.all().delete()
+        self.assertEqual(get_user_stats(self.user.pk).recipe_count, 1)
+
+    def test_stats_endpoint(self):
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        Tag.objects.create(user=self.user, name="unused")
+        for price, time_minutes in ((4, 10), (8, 20)):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title="qwe",
+                time_minutes=time_minutes,
+                price=price,
+            )
+            recipe.tags.add(tag)
+        with self.assertNumQueries(3):
+            res = self.client.get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["recipe_count"], 2)
+        self.assertEqual(res.data["tag_count"], 2)
+        self.assertEqual(
+            res.data["price"],
+            {
+                "total": "12.00",
+                "average": "6.00",
+                "min": "4.00",
+                "max": "8.00",
+            },
+        )
+        self.assertEqual(res.data["time_minutes"]["average"], 15)
+        self.assertEqual(
+            res.data["top_tags"],
+            [{"id": tag.id, "name": "vegan", "recipe_count": 2}],
+        )
+
+    def test_rebuild_stats_command(self):
+        Tag.objects.create(user=self.user, name="vegan")
+        UserStats.objects.all().update(tag_count=5)
+        Tag.objects.all().update(recipe_count=5)
+        out = StringIO()
+        call_command("rebuild_stats", batch_size=1, stdout=out)
+        self.assertIn("Rebuilt stats of 1 users", out.getvalue())
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.tag_count, 1)
+        self.assertEqual(Tag.objects.get().recipe_count, 0)
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+
+BUMP_VERSIONS_SQL = """
+UPDATE core_recipe SET version = version + 1, updated_at = %(now)s
+WHERE id = ANY(%(ids)s)
+RETURNING id, version, updated_at
+"""
+
+
+@contextmanager
+def coalesced_bumps():
+    """ Collects the bumps of the block into one UPDATE run when it exits
+
+    A recipe write saves the row and sets each relation, every step
+    bumps on its own otherwise. Nested blocks join the outermost one,
+    nothing is bumped when the block raises.
+    """
+    if getattr(connection, "pending_bumps", None) is not None:
+        yield
+        return
+    connection.pending_bumps = pending = (set(), [])
+    try:
+        yield
+    finally:
+        connection.pending_bumps = None
+    _bump_recipe_versions(*pending)
+
+
+def bump_recipe_versions(ids, recipes=()):
+    """ Increments version and updated_at of recipes in the database
+
+    Instances passed in recipes get the new values, so responses built
+    from them carry the stored version.
+    """
+    pending = getattr(connection, "pending_bumps", None)
+    if pending is not None:
+        pending[0].update(ids)
+        pending[1].extend(recipes)
+        return
+    _bump_recipe_versions(ids, recipes)
+
+
+def _bump_recipe_versions(ids, recipes):
+    ids = list(ids)
+    if not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(BUMP_VERSIONS_SQL, {"now": timezone.now(), "ids": ids})
+        bumped = {pk: (version, at) for pk, version, at in cursor.fetchall()}
+    for recipe in recipes:
+        if recipe.pk in bumped:
+            recipe.version, recipe.updated_at = bumped[recipe.pk]
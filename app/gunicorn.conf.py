@@ -0,0 +1,62 @@
+"""
+Production serving profile, ``gunicorn -c gunicorn.conf.py
+app.wsgi:application``. Every value can be overridden from the
+environment.
+"""
+import multiprocessing
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# threads cover time spent waiting on the database, processes cover CPU.
+# app.asgi:application is served with GUNICORN_WORKER_CLASS set to
+# uvicorn.workers.UvicornH11Worker, pure python unlike UvicornWorker,
+# which needs uvloop and httptools; threads are then ignored
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = env_int("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+threads = env_int("GUNICORN_THREADS", 2)
+
+# recycle workers to contain memory growth, the jitter keeps them from
+# restarting all at once
+max_requests = env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+timeout = env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = "-"
+
+
+def on_starting(server):
+    """ Refuses to start on failing system checks, e.g. DEBUG on in
+    production, and drops metrics of the previous run """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("check")
+
+    from core.metrics import registry
+
+    registry.clear()
+
+
+def worker_exit(server, worker):
+    """ Keeps the last requests of a recycled worker in the metrics """
+    from core.metrics import registry
+
+    registry.flush(force=True)
+
+
+def child_exit(server, worker):
+    """ Folds the metrics of an exited worker into the totals before a
+    replacement could be handed its pid """
+    from core.metrics import registry
+
+    registry.fold(worker.pid)
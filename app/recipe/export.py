@@ -0,0 +1,79 @@
+import csv
+import json
+
+from django.db.models import prefetch_related_objects
+
+
+CSV_HEADER = (
+    "id",
+    "title",
+    "price",
+    "time_minutes",
+    "link",
+    "tags",
+    "ingredients",
+)
+
+
+def iter_chunks(queryset, chunk_size):
+    """ Yields lists of recipes read through a server-side cursor, with
+    tags and ingredients prefetched for each chunk """
+    chunk = []
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            prefetch_related_objects(chunk, "tags", "ingredients")
+            yield chunk
+            chunk = []
+    if chunk:
+        prefetch_related_objects(chunk, "tags", "ingredients")
+        yield chunk
+
+
+def recipe_row(recipe):
+    return {
+        "id": recipe.id,
+        "title": recipe.title,
+        "price": str(recipe.price),
+        "time_minutes": recipe.time_minutes,
+        "link": recipe.link,
+        "tags": [{"id": t.id, "name": t.name} for t in recipe.tags.all()],
+        "ingredients": [
+            {"id": i.id, "name": i.name} for i in recipe.ingredients.all()
+        ],
+    }
+
+
+def ndjson_lines(chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(recipe_row(recipe)) + "\n" for recipe in chunk
+        )
+
+
+class Echo:
+    """ File-like object handing back written rows to csv.writer """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for chunk in chunks:
+        rows = []
+        for recipe in chunk:
+            row = recipe_row(recipe)
+            row["tags"] = "; ".join(t["name"] for t in row["tags"])
+            row["ingredients"] = "; ".join(
+                i["name"] for i in row["ingredients"]
+            )
+            rows.append(writer.writerow([row[key] for key in CSV_HEADER]))
+        yield "".join(rows)
+
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
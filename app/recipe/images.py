@@ -0,0 +1,50 @@
+import io
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from core.cache import bump_user_version
+from core.models import Recipe
+from core.versions import bump_recipe_versions
+
+
+RENDITIONS = {"image_thumbnail": (150, 150), "image_medium": (600, 600)}
+
+
+def render(source, size):
+    """ Returns a resized JPEG copy of source without metadata """
+    image = ImageOps.exif_transpose(source)
+    image.thumbnail(size)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    # exif and other info is only written when passed explicitly
+    image.save(output, format="JPEG", quality=85, optimize=True)
+    return ContentFile(output.getvalue())
+
+
+def process_recipe_image(recipe_id, stale_files=()):
+    """ Generates renditions of the recipe image and records them """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None and recipe.image:
+        with recipe.image.open("rb") as image_file:
+            source = Image.open(image_file)
+            source.load()
+        updates = {}
+        for field, size in RENDITIONS.items():
+            rendition = getattr(recipe, field)
+            rendition.save("rendition.jpg", render(source, size), save=False)
+            updates[field] = rendition.name
+        # skip the update when a newer upload replaced the image meanwhile
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=recipe.image.name
+        ).update(**updates)
+        if updated:
+            # update() sends no signals, invalidate lists and ETags here
+            bump_user_version(recipe.user_id)
+            bump_recipe_versions([recipe_id])
+        else:
+            stale_files = list(stale_files) + list(updates.values())
+    storage = Recipe._meta.get_field("image").storage
+    for name in stale_files:
+        storage.delete(name)
@@ -0,0 +1,337 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from core.cache import get_cache, get_user_version
+from core.signals import bulk_saved
+
+
+def is_id(value):
+    """ JSON true and false load as bools, which are ints too """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class CachedListMixin:
+    """ Serves list responses from a cache keyed on the user data version
+
+    Any write to the user's tags, ingredients or recipes bumps the version,
+    so cached bodies and ETags never outlive the data they were built from.
+    A matching If-None-Match is answered with 304 before any query runs.
+    Versions live in RESPONSE_CACHE_ALIAS, which has to be shared by all
+    worker processes for a write in one to invalidate the others.
+    """
+
+    def get_list_etag(self, request):
+        version = get_user_version(request.user.pk)
+        params = sorted(request.query_params.lists())
+        raw = f"{request.user.pk}|{version}|{request.path}|{params}"
+        return quote_etag(hashlib.md5(raw.encode("utf-8")).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(request)
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            key = f"list-response:{etag}"
+            data = cache.get(key)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+
+class OrderingMixin:
+    """ Validates the ``ordering`` query param against ``ordering_fields``
+
+    Keyset cursors name the ordering they were taken from, a client
+    changing ``ordering`` has to drop its ``cursor`` and start over.
+    """
+
+    ordering_fields = ()
+
+    def get_ordering(self):
+        """ Return requested ordering with id as keyset tie-breaker """
+        ordering = self.request.query_params.get("ordering")
+        if not ordering:
+            return None
+        name = ordering[1:] if ordering.startswith("-") else ordering
+        if name not in self.ordering_fields:
+            raise ValidationError(
+                {
+                    "ordering": _("Unknown ordering, use one of %s")
+                    % ", ".join(self.ordering_fields)
+                }
+            )
+        # tie-breaker runs the same way so one index scan serves the page
+        return (ordering, "-id" if ordering.startswith("-") else "id")
+
+
+class BulkMixin:
+    """ Bulk create, update and delete through one ``bulk/`` endpoint
+
+    POST takes a list of new objects, PATCH a list of partial updates
+    carrying ``id`` and DELETE a list of ids. Related ids of all items are
+    checked with one query per relation, rows and m2m links are written
+    in batches and the whole request runs in a single transaction. When
+    any item is invalid nothing is written and the response holds a list
+    of errors aligned with the input.
+    """
+
+    bulk_serializer_class = None
+    bulk_max_items = 1000
+    bulk_batch_size = 500
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        serializer_class = self.bulk_serializer_class or self.serializer_class
+        # serializers may leave checks needing a query per item to
+        # validate_bulk_items, which runs them for all items at once
+        kwargs["context"] = {**self.get_serializer_context(), "bulk": True}
+        return serializer_class(*args, **kwargs)
+
+    def get_bulk_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+    def get_bulk_prefetches(self):
+        return [
+            Prefetch(field.name, field.related_model.objects.only("id"))
+            for field in self.queryset.model._meta.many_to_many
+        ]
+
+    @action(methods=["post", "patch", "delete"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError(_("Expected a list of items"))
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                _("Too many items, at most %d allowed") % self.bulk_max_items
+            )
+        handler = {
+            "POST": self.bulk_create,
+            "PATCH": self.bulk_update,
+            "DELETE": self.bulk_destroy,
+        }[request.method]
+        return handler(request, items)
+
+    def bulk_create(self, request, items):
+        data, errors = self.validate_bulk_items(
+            [self.get_bulk_serializer(data=item) for item in items]
+        )
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.queryset.model
+        try:
+            with transaction.atomic():
+                objs = model.objects.bulk_create(
+                    [
+                        model(
+                            user=request.user,
+                            **self.split_relations(values)[0],
+                        )
+                        for values in data
+                    ],
+                    batch_size=self.bulk_batch_size,
+                )
+                relinked = self.bulk_set_relations(objs, data)
+                bulk_saved.send(
+                    sender=model, objs=objs, created=True, relinked=relinked
+                )
+        except IntegrityError:
+            # a concurrent request took a name after validation, checking
+            # again reports it on the item that lost the race
+            errors = self.validate_bulk_items(
+                [self.get_bulk_serializer(data=item) for item in items]
+            )[1]
+            if not any(errors):
+                raise
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            self.bulk_representation(objs), status=status.HTTP_201_CREATED
+        )
+
+    def bulk_update(self, request, items):
+        items = [item if isinstance(item, dict) else {} for item in items]
+        instances = self.get_bulk_queryset().in_bulk(
+            [item["id"] for item in items if is_id(item.get("id"))]
+        )
+        data, errors = self.validate_bulk_items(
+            [
+                self.get_bulk_serializer(
+                    instances[item["id"]], data=item, partial=True
+                )
+                if is_id(item.get("id")) and item["id"] in instances
+                else None
+                for item in items
+            ]
+        )
+        seen = set()
+        for index, item in enumerate(items):
+            pk = item.get("id")
+            if is_id(pk) and pk in seen:
+                # two updates of one row, the last would silently win
+                errors[index] = {**errors[index], "id": [_("Duplicate id.")]}
+            seen.add(pk)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        objs = [instances[item["id"]] for item in items]
+        fields = set()
+        # bulk_update skips pre_save, set auto_now timestamps here
+        auto_now = [
+            field
+            for field in self.queryset.model._meta.concrete_fields
+            if getattr(field, "auto_now", False)
+        ]
+        for instance, values in zip(objs, data):
+            values = self.split_relations(values)[0]
+            for name, value in values.items():
+                setattr(instance, name, value)
+            for field in auto_now:
+                field.pre_save(instance, add=False)
+            fields.update(values)
+        fields.update(field.name for field in auto_now)
+        with transaction.atomic():
+            if fields:
+                self.queryset.model.objects.bulk_update(
+                    objs, fields, batch_size=self.bulk_batch_size
+                )
+            relinked = self.bulk_set_relations(objs, data, replace=True)
+            bulk_saved.send(
+                sender=self.queryset.model,
+                objs=objs,
+                created=False,
+                relinked=relinked,
+            )
+        return Response(self.bulk_representation(objs))
+
+    def bulk_destroy(self, request, ids):
+        existing = set(
+            self.get_bulk_queryset()
+            .filter(id__in=[pk for pk in ids if is_id(pk)])
+            .values_list("id", flat=True)
+        )
+        errors = [
+            {} if is_id(pk) and pk in existing else {"id": [_("Not found.")]}
+            for pk in ids
+        ]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            self.get_bulk_queryset().filter(id__in=existing).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def validate_bulk_items(self, serializers):
+        """ Returns validated data and errors per item, a missing
+        serializer stands for an object that was not found """
+        data = []
+        errors = []
+        for serializer in serializers:
+            if serializer is None:
+                data.append(None)
+                errors.append({"id": [_("Not found.")]})
+            elif serializer.is_valid():
+                data.append(serializer.validated_data)
+                errors.append({})
+            else:
+                data.append(None)
+                errors.append(serializer.errors)
+        self.validate_bulk_relations(data, errors)
+        return data, errors
+
+    def split_relations(self, values):
+        """ Splits validated data into column values and m2m id lists """
+        m2m_names = {f.name for f in self.queryset.model._meta.many_to_many}
+        fields = {k: v for k, v in values.items() if k not in m2m_names}
+        relations = {k: v for k, v in values.items() if k in m2m_names}
+        return fields, relations
+
+    def validate_bulk_relations(self, data, errors):
+        """ Checks related ids of all items with one query per relation """
+        message = PrimaryKeyRelatedField.default_error_messages[
+            "does_not_exist"
+        ]
+        for field in self.queryset.model._meta.many_to_many:
+            wanted = {
+                pk
+                for values in data
+                if values is not None
+                for pk in values.get(field.name, ())
+            }
+            if not wanted:
+                continue
+            found = set(
+                field.related_model.objects.filter(
+                    user=self.request.user, id__in=wanted
+                ).values_list("id", flat=True)
+            )
+            for values, item_errors in zip(data, errors):
+                if values is None:
+                    continue
+                missing = [
+                    message.format(pk_value=pk)
+                    for pk in values.get(field.name, ())
+                    if pk not in found
+                ]
+                if missing:
+                    item_errors[field.name] = missing
+
+    def bulk_set_relations(self, objs, data, replace=False):
+        """ Writes m2m links of saved objects in batches
+
+        Returns {related model: ids} of the objects that gained or lost
+        a link, read before replaced links are deleted.
+        """
+        relinked = {}
+        for field in self.queryset.model._meta.many_to_many:
+            through = field.remote_field.through
+            source = f"{field.m2m_field_name()}_id"
+            target = f"{field.m2m_reverse_field_name()}_id"
+            changed = [
+                (obj, values[field.name])
+                for obj, values in zip(objs, data)
+                if field.name in values
+            ]
+            if not changed:
+                continue
+            old_links = defaultdict(set)
+            if replace:
+                links = through.objects.filter(
+                    **{f"{source}__in": [obj.pk for obj, _ids in changed]}
+                )
+                for obj_id, pk in links.values_list(source, target):
+                    old_links[obj_id].add(pk)
+                links.delete()
+            through.objects.bulk_create(
+                [
+                    through(**{source: obj.pk, target: pk})
+                    for obj, ids in changed
+                    for pk in set(ids)
+                ],
+                batch_size=self.bulk_batch_size,
+            )
+            relinked[field.related_model] = set().union(
+                *(old_links[obj.pk] ^ set(ids) for obj, ids in changed)
+            )
+        return relinked
+
+    def bulk_representation(self, objs):
+        prefetch_related_objects(objs, *self.get_bulk_prefetches())
+        return self.get_serializer(objs, many=True).data
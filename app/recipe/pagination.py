@@ -0,0 +1,136 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """ Keyset (seek) pagination over the queryset ordering
+
+    The cursor stores the ordering values of the last row of a page, so
+    the next page is fetched with a plain range condition on the ordered
+    columns and costs the same as the first one. It also names the
+    ordering it was taken from and is rejected under any other. The
+    ordering must end with a unique column (``id``) to act as a
+    tie-breaker.
+
+    Pagination is opt-in: it only kicks in when the client sends
+    ``cursor`` or ``page_size``, so plain list calls keep their shape.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = _("Invalid cursor")
+
+    def is_requested(self, request):
+        params = request.query_params
+        return (
+            self.cursor_query_param in params
+            or self.page_size_query_param in params
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """ Returns (field, descending) pairs of the queryset ordering """
+        return [
+            (field.lstrip("-"), field.startswith("-"))
+            for field in queryset.query.order_by
+        ]
+
+    def get_ordering_key(self, ordering):
+        return [f"-{f}" if descending else f for f, descending in ordering]
+
+    def encode_cursor(self, ordering, values):
+        cursor = {
+            "ordering": self.get_ordering_key(ordering),
+            "values": values,
+        }
+        raw = json.dumps(cursor, default=str).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, request, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(cursor, dict)
+            or cursor.get("ordering") != self.get_ordering_key(ordering)
+            or not isinstance(cursor.get("values"), list)
+            or len(cursor["values"]) != len(ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor["values"]
+
+    def get_seek_filter(self, ordering, values):
+        """ Builds a filter for rows placed after ``values`` in order """
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(ordering, values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        # redundant bound on the leading column lets the index range scan
+        # start at the cursor instead of filtering all previous rows
+        (field, descending), value = ordering[0], values[0]
+        lookup = "lte" if descending else "gte"
+        return Q(**{f"{field}__{lookup}": value}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        if not self.ordering or self.ordering[-1][0] not in ("id", "pk"):
+            queryset = queryset.order_by(*queryset.query.order_by, "-id")
+            self.ordering = self.get_ordering(queryset)
+        size = self.get_page_size(request)
+        values = self.decode_cursor(request, self.ordering)
+        if values is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_seek_filter(self.ordering, values)
+                )
+            except (TypeError, ValueError, ValidationError):
+                # values of the right ordering that the columns reject
+                raise NotFound(self.invalid_cursor_message)
+        page = list(queryset[: size + 1])
+        self.has_next = len(page) > size
+        page = page[:size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        values = [
+            getattr(self.last, field) for field, _desc in self.ordering
+        ]
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.ordering, values)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict([("next", self.get_next_link()), ("results", data)])
+        )
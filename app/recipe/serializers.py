@@ -1,33 +1,94 @@
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, UserStats
+from core.search import coalesced_vector_updates
+from core.serializers import TimedSerializerMixin
+from core.signals import bulk_saved
+from core.versions import coalesced_bumps
 
 
-class TagSerializer(serializers.ModelSerializer):
+DUPLICATE_NAME = _("You already have one with this name.")
+
+
+class NamedObjectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """ Checks the (user, name) uniqueness of tags and ingredients
+
+    ``with_counts`` adds the number of recipes using each object.
+    """
+
+    def __init__(self, *args, with_counts=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not with_counts:
+            self.fields.pop("recipe_count")
+
+    def validate_name(self, value):
+        if self.context.get("bulk"):
+            # checked for all items at once by the bulk view
+            return value
+        queryset = self.Meta.model.objects.filter(
+            user=self.context["request"].user, name=value
+        )
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(DUPLICATE_NAME)
+        return value
+
+
+class TagSerializer(NamedObjectSerializer):
     """ Serializer for tag objects """
 
     class Meta:
         model = Tag
-        fields = ("id", "name")
-        read_only_fields = ("id",)
+        fields = ("id", "name", "recipe_count")
+        read_only_fields = ("id", "recipe_count")
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(NamedObjectSerializer):
     """ Serializer for ingredient objects """
 
     class Meta:
         model = Ingredient
-        fields = ("id", "name")
-        read_only_fields = ("id",)
+        fields = ("id", "name", "recipe_count")
+        read_only_fields = ("id", "recipe_count")
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """ Serializer for ingredient objects """
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """ Serializer for ingredient objects
+
+    ``fields`` limits the output to the given field names and ``expand``
+    nests full objects for the given relations instead of their ids.
+    Writes may name tags and ingredients in ``tag_names`` and
+    ``ingredient_names``, missing ones are created for the user and the
+    relation is replaced as with the id lists. Either one is required
+    for each relation unless the write is partial.
+    """
+
+    expandable_fields = {
+        "ingredients": IngredientSerializer,
+        "tags": TagSerializer,
+    }
+    default_expand = ()
+
+    name_fields = {"ingredient_names": "ingredients", "tag_names": "tags"}
 
+    # required unless the *_names counterpart is sent, see validate
     ingredients = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Ingredient.objects.all()
+        many=True, queryset=Ingredient.objects.all(), required=False
     )
     tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
+        many=True, queryset=Tag.objects.all(), required=False
+    )
+    ingredient_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False,
+    )
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False,
     )
 
     class Meta:
@@ -38,19 +99,170 @@ class RecipeSerializer(serializers.ModelSerializer):
             "price",
             "time_minutes",
             "link",
+            "image",
+            "image_thumbnail",
+            "image_medium",
             "ingredients",
             "tags",
+            "ingredient_names",
+            "tag_names",
+        )
+        # images are written by upload-image and its renditions by
+        # recipe.images
+        read_only_fields = ("id", "image", "image_thumbnail", "image_medium")
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is None:
+            expand = self.default_expand
+        for name in expand:
+            if name in self.fields:
+                self.fields[name] = self.expandable_fields[name](
+                    many=True, read_only=True
+                )
+
+    def validate(self, attrs):
+        """ Keeps each relation required, its ``*_names`` counterpart
+        standing in for the id list """
+        if self.partial:
+            return attrs
+        errors = {}
+        for names_field, field_name in self.name_fields.items():
+            if names_field not in self.fields:
+                continue
+            if field_name not in attrs and names_field not in attrs:
+                field = self.fields[field_name]
+                errors[field_name] = [field.error_messages["required"]]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        # saving and setting each relation would bump and rebuild alone
+        with transaction.atomic(), coalesced_bumps():
+            with coalesced_vector_updates():
+                self.resolve_names(validated_data)
+                return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic(), coalesced_bumps():
+            with coalesced_vector_updates():
+                self.resolve_names(validated_data)
+                return super().update(instance, validated_data)
+
+    def resolve_names(self, validated_data):
+        """ Resolves ``*_names`` into objects of their relation, looking
+        up all names of a relation at once
+
+        Named objects join the ids sent for the same relation. Like the
+        id lists, the result replaces the relation on update, a PATCH
+        with only ``tag_names`` leaves exactly those tags.
+        """
+        user = self.context["request"].user
+        for names_field, field_name in self.name_fields.items():
+            names = validated_data.pop(names_field, None)
+            if names is None:
+                continue
+            model = Recipe._meta.get_field(field_name).related_model
+            found, created = model.objects.get_or_create_names(user, names)
+            if created:
+                bulk_saved.send(sender=model, objs=created, created=True)
+            validated_data[field_name] = [
+                *validated_data.get(field_name, ()),
+                *found.values(),
+            ]
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """ Serializer for bulk recipe writes, related ids are checked by the
+    view for all items at once instead of one lookup per id """
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    ingredient_names = None
+    tag_names = None
+
+    class Meta(RecipeSerializer.Meta):
+        fields = tuple(
+            name
+            for name in RecipeSerializer.Meta.fields
+            if name not in RecipeSerializer.name_fields
         )
-        read_only_fields = ("id",)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    default_expand = ("ingredients", "tags")
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Recipe
-        fields = ("id", "image")
-        read_only_fields = ("id",)
+        fields = ("id", "image", "image_thumbnail", "image_medium")
+        read_only_fields = ("id", "image_thumbnail", "image_medium")
+
+
+class UsageSerializer(serializers.Serializer):
+    """ Tag or ingredient with the number of recipes using it """
+
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class PriceStatsSerializer(serializers.Serializer):
+    total = serializers.DecimalField(14, 2, source="price_total")
+    average = serializers.DecimalField(14, 2, source="price_average")
+    min = serializers.DecimalField(5, 2, source="price_min")
+    max = serializers.DecimalField(5, 2, source="price_max")
+
+
+class TimeStatsSerializer(serializers.Serializer):
+    total = serializers.IntegerField(source="time_minutes_total")
+    average = serializers.FloatField(source="time_minutes_average")
+    min = serializers.IntegerField(source="time_minutes_min")
+    max = serializers.IntegerField(source="time_minutes_max")
+
+
+class UserStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """ Serializer for the recipe summary of a user """
+
+    top_count = 10
+
+    price = PriceStatsSerializer(source="*")
+    time_minutes = TimeStatsSerializer(source="*")
+    top_tags = serializers.SerializerMethodField()
+    top_ingredients = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserStats
+        fields = (
+            "recipe_count",
+            "tag_count",
+            "ingredient_count",
+            "price",
+            "time_minutes",
+            "top_tags",
+            "top_ingredients",
+        )
+
+    def get_top_tags(self, obj):
+        return self.most_used(Tag, obj.user_id)
+
+    def get_top_ingredients(self, obj):
+        return self.most_used(Ingredient, obj.user_id)
+
+    def most_used(self, model, user_id):
+        """ Reads the first rows of the (user, recipe_count) index """
+        used = (
+            model.objects.filter(user_id=user_id, recipe_count__gt=0)
+            .order_by("-recipe_count", "-id")
+            .only("id", "name", "recipe_count")[: self.top_count]
+        )
+        return UsageSerializer(used, many=True).data
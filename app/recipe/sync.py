@@ -0,0 +1,120 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import serializers
+
+
+INVALID_CURSOR = _("Invalid cursor")
+
+# (response key, model, serializer of live rows)
+SYNCED = (
+    ("tags", Tag, serializers.TagSerializer),
+    ("ingredients", Ingredient, serializers.IngredientSerializer),
+    ("recipes", Recipe, serializers.RecipeSerializer),
+)
+
+
+def encode_cursor(positions):
+    raw = json.dumps(
+        {
+            key: [updated_at.isoformat(), pk]
+            for key, (updated_at, pk) in positions.items()
+        }
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(encoded):
+    """ Returns {key: (updated_at, id)} of the last rows a client has """
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        positions = {
+            key: (parse_datetime(raw[key][0]), int(raw[key][1]))
+            for key, _model, _serializer in SYNCED
+            if key in raw
+        }
+    except (TypeError, ValueError, UnicodeDecodeError, LookupError):
+        raise NotFound(INVALID_CURSOR)
+    if any(updated_at is None for updated_at, _pk in positions.values()):
+        raise NotFound(INVALID_CURSOR)
+    return positions
+
+
+def get_changes(model, user, position, limit):
+    """ Returns up to limit + 1 rows changed after position, oldest first
+
+    Reads one range of the (user, updated_at, id) index. A first sync
+    without position skips tombstones.
+    """
+    queryset = model.all_objects.filter(user=user)
+    if position is None:
+        queryset = queryset.filter(deleted_at__isnull=True)
+    else:
+        updated_at, pk = position
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+        )
+    if model is Recipe:
+        queryset = queryset.prefetch_related(
+            *(
+                Prefetch(field.name, field.related_model.objects.only("id"))
+                for field in Recipe._meta.many_to_many
+            )
+        )
+    return list(queryset.order_by("updated_at", "id")[: limit + 1])
+
+
+def next_position(position, rows, more, now):
+    """ Returns where the next sync of a model starts
+
+    updated_at is taken when a write starts, a transaction committing
+    later can add rows behind rows already sent. Near the head of the
+    changes the position stays ``commit_window`` seconds back, so such
+    rows are picked up by the next sync and recent rows may come twice.
+    """
+    if not rows:
+        return position
+    last = (rows[-1].updated_at, rows[-1].pk)
+    if more:
+        return last
+    settled = (now - timedelta(seconds=settings.SYNC["commit_window"]), 0)
+    if last <= settled:
+        return last
+    if position is None or position < settled:
+        return settled
+    return position
+
+
+def build_sync(user, positions, limit, context):
+    """ Returns one page of changes of the user's tags, ingredients and
+    recipes after positions """
+    now = timezone.now()
+    data = {"deleted": {}}
+    has_more = False
+    next_positions = {}
+    for key, model, serializer_class in SYNCED:
+        position = positions.get(key)
+        rows = get_changes(model, user, position, limit)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        live = [row for row in rows if row.deleted_at is None]
+        data[key] = serializer_class(live, many=True, context=context).data
+        data["deleted"][key] = [
+            row.pk for row in rows if row.deleted_at is not None
+        ]
+        position = next_position(position, rows, more, now)
+        if position is not None:
+            next_positions[key] = position
+        has_more = has_more or more
+    data["cursor"] = encode_cursor(next_positions)
+    data["has_more"] = has_more
+    return data
@@ -0,0 +1,235 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest.mock import patch
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from recipe.views import TagViewSet
+
+
+RECIPE_BULK_URL = reverse("recipe:recipe-bulk")
+TAG_BULK_URL = reverse("recipe:tag-bulk")
+
+
+def sample_recipe(user, **params):
+    defaults = {"title": "sample recipe", "time_minutes": 10, "price": 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class BulkApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="qwe")
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name="asd"
+        )
+
+    def recipe_payload(self, count):
+        return [
+            {
+                "title": f"recipe {i}",
+                "time_minutes": 5,
+                "price": "10.00",
+                "tags": [self.tag.id],
+                "ingredients": [self.ingredient.id],
+            }
+            for i in range(count)
+        ]
+
+    def post_bulk(self, url, payload):
+        return self.client.post(url, payload, format="json")
+
+    def test_bulk_create_recipes(self):
+        res = self.post_bulk(RECIPE_BULK_URL, self.recipe_payload(3))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0]["tags"], [self.tag.id])
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(
+                list(recipe.ingredients.all()), [self.ingredient]
+            )
+
+    def test_bulk_create_queries_constant(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post_bulk(RECIPE_BULK_URL, self.recipe_payload(2))
+        with CaptureQueriesContext(connection) as large:
+            self.post_bulk(RECIPE_BULK_URL, self.recipe_payload(20))
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_create_item_errors(self):
+        """ Tests that one bad item fails whole request with its errors """
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        foreign_tag = Tag.objects.create(user=other, name="foreign")
+        payload = self.recipe_payload(3)
+        payload[1]["tags"] = [foreign_tag.id]
+        del payload[2]["title"]
+        res = self.post_bulk(RECIPE_BULK_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("tags", res.data[1])
+        self.assertIn("title", res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_requires_list(self):
+        res = self.post_bulk(RECIPE_BULK_URL, {"title": "qwe"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_recipes(self):
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        recipe2.tags.add(self.tag)
+        new_tag = Tag.objects.create(user=self.user, name="zxc")
+        payload = [
+            {"id": recipe1.id, "title": "changed"},
+            {"id": recipe2.id, "tags": [new_tag.id]},
+        ]
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        self.assertEqual(recipe1.title, "changed")
+        self.assertEqual(list(recipe2.tags.all()), [new_tag])
+
+    def test_bulk_update_unknown_id(self):
+        recipe = sample_recipe(self.user)
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        foreign = sample_recipe(other)
+        payload = [
+            {"id": recipe.id, "title": "changed"},
+            {"id": foreign.id, "title": "changed"},
+        ]
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("id", res.data[1])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "sample recipe")
+
+    def test_bulk_delete_recipes(self):
+        recipe1 = sample_recipe(self.user)
+        recipe2 = sample_recipe(self.user)
+        sample_recipe(self.user)
+        res = self.client.delete(
+            RECIPE_BULK_URL, [recipe1.id, recipe2.id], format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def delete_bulk_queries(self, count):
+        res = self.post_bulk(RECIPE_BULK_URL, self.recipe_payload(count))
+        ids = [item["id"] for item in res.data]
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.delete(RECIPE_BULK_URL, ids, format="json")
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        return len(ctx)
+
+    def test_bulk_delete_queries_constant(self):
+        self.assertEqual(
+            self.delete_bulk_queries(2), self.delete_bulk_queries(20)
+        )
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(Recipe.all_objects.count(), 22)
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+        self.assertEqual(self.user.stats.recipe_count, 0)
+
+    def test_bulk_create_tags(self):
+        res = self.post_bulk(TAG_BULK_URL, [{"name": "a"}, {"name": "b"}])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_create_repeated_tag_names(self):
+        res = self.post_bulk(TAG_BULK_URL, [{"name": "a"}, {"name": "a"}])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("name", res.data[1])
+
+    def test_bulk_create_taken_tag_names(self):
+        res = self.post_bulk(TAG_BULK_URL, [{"name": "a"}, {"name": "qwe"}])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("name", res.data[1])
+
+    def test_bulk_rename_keeps_own_name(self):
+        res = self.client.patch(
+            TAG_BULK_URL, [{"id": self.tag.id, "name": "qwe"}], format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_tag_names_checked_in_one_query(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post_bulk(TAG_BULK_URL, [{"name": f"s{i}"} for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.post_bulk(
+                TAG_BULK_URL, [{"name": f"l{i}"} for i in range(20)]
+            )
+        self.assertEqual(len(small), len(large))
+
+    def test_bool_ids_rejected(self):
+        recipe = sample_recipe(self.user)
+        Recipe.objects.filter(pk=recipe.pk).update(id=1)
+        res = self.client.delete(RECIPE_BULK_URL, [True], format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.patch(
+            RECIPE_BULK_URL, [{"id": True, "title": "qwe"}], format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(pk=1).exists())
+
+    def test_duplicate_ids_rejected(self):
+        recipe = sample_recipe(self.user)
+        res = self.client.patch(
+            RECIPE_BULK_URL,
+            [{"id": recipe.id, "title": "a"}, {"id": recipe.id, "title": "b"}],
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("id", res.data[1])
+        recipe.refresh_from_db()
+        self.assertNotIn(recipe.title, ("a", "b"))
+
+    def test_bulk_create_loses_name_race(self):
+        """ Tests that a name taken after validation is a 400, not a 500 """
+        validate = TagViewSet.validate_bulk_items
+
+        def validate_then_race(view, serializers):
+            result = validate(view, serializers)
+            if not Tag.objects.filter(name="race").exists():
+                Tag.objects.create(user=self.user, name="race")
+            return result
+
+        with patch.object(
+            TagViewSet, "validate_bulk_items", validate_then_race
+        ):
+            res = self.client.post(
+                TAG_BULK_URL,
+                [{"name": "calm"}, {"name": "race"}],
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("name", res.data[1])
+        self.assertFalse(Tag.objects.filter(name="calm").exists())
+
+    def test_bulk_invalidates_list_cache(self):
+        tags_url = reverse("recipe:tag-list")
+        res = self.client.get(tags_url)
+        self.post_bulk(TAG_BULK_URL, [{"name": "a"}])
+        new = self.client.get(tags_url)
+        self.assertNotEqual(res["ETag"], new["ETag"])
+        self.assertEqual(len(new.data), 2)
@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+TAG_BULK_URL = reverse("recipe:tag-bulk")
+
+
+def detail_url(id):
+    return reverse("recipe:recipe-detail", args=[id])
+
+
+class RecipeConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="vegan")
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=5, price=5
+        )
+        self.recipe.tags.add(self.tag)
+        self.url = detail_url(self.recipe.id)
+
+    def version(self):
+        return Recipe.objects.get(pk=self.recipe.pk).version
+
+    def test_detail_has_validators(self):
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["ETag"], f'"{self.recipe.id}-{self.version()}"')
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        self.assertEqual(
+            res["Last-Modified"], http_date(updated_at.timestamp())
+        )
+        self.assertIn("private", res["Cache-Control"])
+
+    def test_if_none_match_skips_related_objects(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(len(ctx), 1)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_link_changes_bump_version(self):
+        version = self.version()
+        etag = self.client.get(self.url)["ETag"]
+
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="tea")
+        )
+        self.assertEqual(self.version(), version + 1)
+        self.tag.recipe_set.remove(self.recipe)
+        self.assertEqual(self.version(), version + 2)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["tags"], [])
+
+    def test_rename_bumps_linked_versions(self):
+        version = self.version()
+
+        self.tag.name = "vegetarian"
+        self.tag.save()
+        self.assertEqual(self.version(), version + 1)
+
+        res = self.client.patch(
+            TAG_BULK_URL,
+            [{"id": self.tag.id, "name": "raw"}],
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.version(), version + 2)
+
+    def test_update_bumps_version_once(self):
+        version = self.version()
+        ingredient = Ingredient.objects.create(user=self.user, name="tea")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.put(
+                self.url,
+                {
+                    "title": "asd",
+                    "time_minutes": 5,
+                    "price": 5,
+                    "ingredients": [ingredient.id],
+                    "tag_names": ["raw"],
+                },
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        bumps = [q for q in ctx.captured_queries if "SET version" in q["sql"]]
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual(self.version(), version + 1)
+        self.assertEqual(res["ETag"], f'"{self.recipe.id}-{version + 1}"')
+
+    def test_if_match_mismatch_fails(self):
+        res = self.client.patch(
+            self.url,
+            {"title": "asd"},
+            HTTP_IF_MATCH=f'"{self.recipe.id}-0"',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "qwe")
+
+    def test_if_match_updates_and_returns_new_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        res = self.client.patch(self.url, {"title": "asd"}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "asd")
+        self.assertEqual(res["ETag"], f'"{self.recipe.id}-{self.version()}"')
+        self.assertNotEqual(res["ETag"], etag)
+
+        res = self.client.put(
+            self.url,
+            {"title": "zxc", "time_minutes": 5, "price": 5},
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
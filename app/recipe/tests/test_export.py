@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from recipe.views import RecipeViewSet
+
+
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+class RecipeExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="salt")
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"recipe {i}", time_minutes=5, price=5
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def export(self, params=None):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_export_ndjson(self):
+        self.create_recipes(2)
+        lines = self.export().splitlines()
+        self.assertEqual(len(lines), 2)
+        row = json.loads(lines[0])
+        self.assertEqual(row["title"], "recipe 1")
+        self.assertEqual(row["tags"][0]["name"], "vegan")
+        self.assertEqual(row["ingredients"][0]["name"], "salt")
+
+    def test_export_csv(self):
+        self.create_recipes(2)
+        rows = list(csv.reader(io.StringIO(self.export({"type": "csv"}))))
+        self.assertEqual(rows[0][0], "id")
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][5], "vegan")
+
+    def test_export_limited_to_user(self):
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        Recipe.objects.create(user=other, title="qwe", time_minutes=5, price=5)
+        self.assertEqual(self.export(), "")
+
+    def test_export_unknown_type(self):
+        res = self.client.get(EXPORT_URL, {"type": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(RecipeViewSet, "export_chunk_size", 2)
+    def test_export_prefetches_per_chunk(self):
+        """ Tests that m2m queries grow with chunks, not recipes """
+        self.create_recipes(6)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self.export().splitlines()), 6)
+        self.assertEqual(len(ctx), 1 + 3 * 2)
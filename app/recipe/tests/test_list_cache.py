@@ -0,0 +1,106 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag
+
+
+TAGS_URL = reverse("recipe:tag-list")
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+class ListCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name="qwe")
+
+    def test_cached_list_served_without_queries(self):
+        first = self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(TAGS_URL)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_not_modified(self):
+        res = self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(res.content)
+
+    def test_write_invalidates(self):
+        res = self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {"name": "asd"})
+        new = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(new.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(new.data), 2)
+        self.assertNotEqual(res["ETag"], new["ETag"])
+
+    def test_m2m_change_invalidates(self):
+        recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=5, price=5
+        )
+        res = self.client.get(RECIPE_URL)
+        recipe.tags.add(Tag.objects.get())
+        new = self.client.get(RECIPE_URL)
+        self.assertNotEqual(res["ETag"], new["ETag"])
+        self.assertEqual(len(new.data[0]["tags"]), 1)
+
+    def test_query_params_in_key(self):
+        res = self.client.get(TAGS_URL)
+        assigned = self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertNotEqual(res["ETag"], assigned["ETag"])
+        self.assertEqual(len(assigned.data), 0)
+
+    def test_cache_per_user(self):
+        res = self.client.get(TAGS_URL)
+        user2 = get_user_model().objects.create_user(
+            email="test2@test.ru", password="secret"
+        )
+        self.client.force_authenticate(user2)
+        other = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertEqual(other.data, [])
+
+
+class SharedListCacheTests(TestCase):
+    """ Two cache instances over one store, as two worker processes
+    pointed at the same CACHE_LOCATION would have """
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        backend = "django.core.cache.backends.filebased.FileBasedCache"
+        caches = {
+            alias: {"BACKEND": backend, "LOCATION": location.name}
+            for alias in ("default", "worker_a", "worker_b")
+        }
+        override = override_settings(CACHES=caches)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def worker(self, alias):
+        return override_settings(RESPONSE_CACHE_ALIAS=alias)
+
+    def test_write_on_one_worker_invalidates_the_other(self):
+        with self.worker("worker_a"):
+            res = self.client.get(TAGS_URL)
+        with self.worker("worker_b"):
+            self.client.post(TAGS_URL, {"name": "asd"})
+        with self.worker("worker_a"):
+            new = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(new.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag["name"] for tag in new.data], ["asd"])
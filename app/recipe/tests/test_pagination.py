@@ -0,0 +1,119 @@
+import base64
+import json
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag
+
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def encode_cursor(cursor):
+    raw = json.dumps(cursor).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def sample_recipe(user, **params):
+    defaults = {"title": "sample recipe", "time_minutes": 10, "price": 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def collect_pages(self, url, page_size):
+        """ Follows next links and returns all pages """
+        pages = []
+        res = self.client.get(url, {"page_size": page_size})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data["results"])
+            if not res.data["next"]:
+                return pages
+            res = self.client.get(res.data["next"])
+
+    def test_list_not_paginated_by_default(self):
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_pages_follow_ordering_with_ties(self):
+        """ Tests that equal titles are split between pages by id """
+        for title in ["b", "a", "b", "b", "c", "a", "b"]:
+            sample_recipe(user=self.user, title=title)
+        pages = self.collect_pages(RECIPE_URL, 2)
+        ids = [item["id"] for page in pages for item in page]
+        expected = list(
+            Recipe.objects.order_by("-title", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_capped(self):
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL, {"page_size": 100000})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIsNone(res.data["next"])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(RECIPE_URL, {"cursor": "garbage"})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_values(self):
+        """ Tests that values the ordered columns reject are not a 500 """
+        sample_recipe(user=self.user)
+        cursor = encode_cursor(
+            {"ordering": ["-title", "-id"], "values": ["x", "y"]}
+        )
+        res = self.client.get(RECIPE_URL, {"cursor": cursor})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_of_other_ordering(self):
+        for title in ["t1", "t2", "t3"]:
+            sample_recipe(user=self.user, title=title)
+        res = self.client.get(RECIPE_URL, {"page_size": 1})
+        cursor = parse_qs(urlparse(res.data["next"]).query)["cursor"][0]
+        res = self.client.get(RECIPE_URL, {"cursor": cursor})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(
+            RECIPE_URL, {"cursor": cursor, "ordering": "price"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_paginated_by_name(self):
+        for name in ["qwe", "asd", "zxc", "asf"]:
+            Tag.objects.create(user=self.user, name=name)
+        pages = self.collect_pages(TAGS_URL, 3)
+        names = [item["name"] for page in pages for item in page]
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(names, ["zxc", "qwe", "asf", "asd"])
+
+    def test_deep_page_costs_same_as_first(self):
+        for i in range(10):
+            sample_recipe(user=self.user, title=f"recipe {i}")
+        with CaptureQueriesContext(connection) as first_ctx:
+            first = self.client.get(RECIPE_URL, {"page_size": 2})
+        with CaptureQueriesContext(connection) as next_ctx:
+            self.client.get(first.data["next"])
+        self.assertEqual(len(first_ctx), len(next_ctx))
+        self.assertNotIn("OFFSET", next_ctx.captured_queries[0]["sql"])
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+def detail_url(id):
+    return reverse("recipe:recipe-detail", args=[id])
+
+
+class RecipeQueryCountTests(TestCase):
+    """ Tests that query counts do not grow with result size """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count, relations=2):
+        """ Creates recipes each with own tags and ingredients """
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"recipe {i}", time_minutes=5, price=5
+            )
+            for j in range(relations):
+                recipe.tags.add(
+                    Tag.objects.create(user=self.user, name=f"tag {i} {j}")
+                )
+                recipe.ingredients.add(
+                    Ingredient.objects.create(
+                        user=self.user, name=f"ingredient {i} {j}"
+                    )
+                )
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx)
+
+    def test_list_queries_constant(self):
+        self.create_recipes(1)
+        small = self.count_queries(RECIPE_URL)
+        self.create_recipes(10)
+        large = self.count_queries(RECIPE_URL)
+        self.assertEqual(small, large)
+        self.assertEqual(large, 3)
+
+    def test_paginated_list_queries_constant(self):
+        self.create_recipes(2)
+        small = self.count_queries(RECIPE_URL, {"page_size": 2})
+        self.create_recipes(10)
+        large = self.count_queries(RECIPE_URL, {"page_size": 10})
+        self.assertEqual(small, large)
+
+    def test_detail_queries_constant(self):
+        self.create_recipes(1, relations=1)
+        small = Recipe.objects.get()
+        self.create_recipes(1, relations=10)
+        large = Recipe.objects.exclude(pk=small.pk).get()
+        small_count = self.count_queries(detail_url(small.id))
+        large_count = self.count_queries(detail_url(large.id))
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(large_count, 3)
+
+    def test_sparse_fields_skip_prefetches(self):
+        self.create_recipes(3)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, {"fields": "id,title"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn("search_vector", ctx.captured_queries[0]["sql"])
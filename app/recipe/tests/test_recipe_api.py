@@ -1,12 +1,17 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe, Tag, Ingredient
+from rest_framework.utils.urls import replace_query_param
+from core.models import NamedQuerySet, Recipe, Tag, Ingredient
+from recipe.images import process_recipe_image
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 import tempfile
 import os
+from io import StringIO
+from unittest.mock import patch
 from PIL import Image
 
 
@@ -164,7 +169,18 @@ class RecipeImageUploadTests(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
         self.recipe.image.delete()
+        self.recipe.image_thumbnail.delete()
+        self.recipe.image_medium.delete()
+
+    def post_image(self, size=(10, 10), **save_kwargs):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as file:
+            image = Image.new("RGB", size)
+            image.save(file, format="JPEG", **save_kwargs)
+            file.seek(0)
+            return self.client.post(url, {"image": file}, format="multipart")
 
     def test_upload(self):
         url = image_upload_url(self.recipe.id)
@@ -178,6 +194,57 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn("image", res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @patch("core.tasks.transaction.on_commit")
+    def test_upload_returns_before_processing(self, on_commit):
+        res = self.post_image()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["image_thumbnail"])
+        self.assertEqual(on_commit.call_count, 1)
+
+    @override_settings(BACKGROUND_TASKS_ASYNC=False)
+    def test_upload_builds_renditions(self):
+        exif = Image.Exif()
+        exif[0x010F] = "camera maker"
+        self.post_image(size=(1200, 800), exif=exif.tobytes())
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (150, 100))
+            self.assertFalse(thumbnail.getexif())
+        with Image.open(self.recipe.image_medium.path) as medium:
+            self.assertEqual(medium.size, (600, 400))
+
+    @patch("core.tasks.transaction.on_commit")
+    def test_renditions_served_by_list_and_detail(self, on_commit):
+        self.post_image()
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+        listed = self.client.get(RECIPE_URL)
+        self.assertIsNone(listed.data[0]["image_thumbnail"])
+
+        process_recipe_image(self.recipe.id)
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertTrue(res.data["image_medium"].endswith(".jpg"))
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=listed["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data[0]["image_thumbnail"].endswith(".jpg"))
+
+    @override_settings(BACKGROUND_TASKS_ASYNC=False)
+    def test_reupload_removes_old_files(self):
+        self.post_image()
+        self.recipe.refresh_from_db()
+        old_image = self.recipe.image.path
+        old_thumbnail = self.recipe.image_thumbnail.path
+        self.post_image()
+        self.assertFalse(os.path.exists(old_image))
+        self.assertFalse(os.path.exists(old_thumbnail))
+
+    def test_process_images_command(self):
+        self.post_image()
+        call_command("process_recipe_images", stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image_thumbnail.path))
+
     def test_upload_bad_request(self):
         url = image_upload_url(self.recipe.id)
         res = self.client.post(url, {"image": "qwe"}, format="multipart")
@@ -216,3 +283,329 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+
+class RecipeFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag1 = sample_tag(user=self.user, name="qwe")
+        self.tag2 = sample_tag(user=self.user, name="asd")
+        self.ing1 = sample_ingredient(user=self.user, name="qwe")
+        self.ing2 = sample_ingredient(user=self.user, name="asd")
+
+    def result_ids(self, params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in res.data]
+
+    def test_filter_by_tags(self):
+        recipe1 = sample_recipe(user=self.user, title="qwe")
+        recipe2 = sample_recipe(user=self.user, title="asd")
+        recipe3 = sample_recipe(user=self.user, title="zxc")
+        recipe1.tags.add(self.tag1)
+        recipe2.tags.add(self.tag2)
+        ids = self.result_ids({"tags": f"{self.tag1.id},{self.tag2.id}"})
+        self.assertEqual(ids, [recipe1.id, recipe2.id])
+        self.assertNotIn(recipe3.id, ids)
+
+    def test_filter_by_ingredients(self):
+        recipe1 = sample_recipe(user=self.user, title="qwe")
+        recipe2 = sample_recipe(user=self.user, title="asd")
+        recipe1.ingredients.add(self.ing1)
+        recipe2.ingredients.add(self.ing2)
+        ids = self.result_ids({"ingredients": f"{self.ing1.id}"})
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_filter_results_unique(self):
+        """ Tests that recipe matching several ids is returned once """
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(self.tag1, self.tag2)
+        recipe.ingredients.add(self.ing1, self.ing2)
+        ids = self.result_ids(
+            {
+                "tags": f"{self.tag1.id},{self.tag2.id}",
+                "ingredients": f"{self.ing1.id},{self.ing2.id}",
+            }
+        )
+        self.assertEqual(ids, [recipe.id])
+
+    def test_filter_match_all_tags(self):
+        recipe1 = sample_recipe(user=self.user, title="qwe")
+        recipe2 = sample_recipe(user=self.user, title="asd")
+        recipe1.tags.add(self.tag1, self.tag2)
+        recipe2.tags.add(self.tag1)
+        ids = self.result_ids(
+            {"tags": f"{self.tag1.id},{self.tag2.id}", "match": "all"}
+        )
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_filter_match_all_repeated_id(self):
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(self.tag1)
+        ids = self.result_ids(
+            {"tags": f"{self.tag1.id},{self.tag1.id}", "match": "all"}
+        )
+        self.assertEqual(ids, [recipe.id])
+
+
+class RecipeRangeFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.cheap = sample_recipe(
+            user=self.user, title="qwe", price=4.50, time_minutes=20
+        )
+        self.quick = sample_recipe(
+            user=self.user, title="asd", price=12.00, time_minutes=10
+        )
+        self.slow = sample_recipe(
+            user=self.user, title="zxc", price=8.00, time_minutes=90
+        )
+
+    def result_ids(self, params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in res.data]
+
+    def test_filter_by_price_and_time(self):
+        ids = self.result_ids({"price_max": "10", "time_max": 30})
+        self.assertEqual(ids, [self.cheap.id])
+
+        ids = self.result_ids({"price_min": "8.00", "ordering": "price"})
+        self.assertEqual(ids, [self.slow.id, self.quick.id])
+
+    def test_ordering(self):
+        ids = self.result_ids({"ordering": "time_minutes"})
+        self.assertEqual(ids, [self.quick.id, self.cheap.id, self.slow.id])
+
+        ids = self.result_ids({"ordering": "-price"})
+        self.assertEqual(ids, [self.quick.id, self.slow.id, self.cheap.id])
+
+    def test_invalid_params(self):
+        for params in (
+            {"price_min": "cheap"},
+            {"price_max": "nan"},
+            {"time_max": "1.5"},
+            {"ordering": "link"},
+            {"ordering": "--title"},
+        ):
+            res = self.client.get(RECIPE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), res.data)
+
+    def test_keyset_pages_follow_ordering(self):
+        sample_recipe(user=self.user, price=8.00, time_minutes=5)
+        ids = []
+        params = {"ordering": "price", "page_size": 1}
+        res = self.client.get(RECIPE_URL, params)
+        while True:
+            ids.extend(item["id"] for item in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+        expected = list(
+            Recipe.objects.filter(user=self.user)
+            .order_by("price", "id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_ordering_switched_mid_pagination(self):
+        """ Tests that a cursor only continues the ordering it came from """
+        params = {"ordering": "title", "page_size": 1}
+        res = self.client.get(RECIPE_URL, params)
+        next_url = res.data["next"]
+
+        for ordering in ("price", "-title"):
+            url = replace_query_param(next_url, "ordering", ordering)
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(next_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class RecipeSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+        self.tag = sample_tag(user=self.user)
+        self.recipe.tags.add(self.tag)
+
+    def test_list_fields(self):
+        res = self.client.get(RECIPE_URL, {"fields": "id,title"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, [{"id": self.recipe.id, "title": self.recipe.title}]
+        )
+
+    def test_list_expand(self):
+        res = self.client.get(
+            RECIPE_URL, {"fields": "id,tags,ingredients", "expand": "tags"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data[0],
+            {
+                "id": self.recipe.id,
+                "tags": [{"id": self.tag.id, "name": self.tag.name}],
+                "ingredients": [],
+            },
+        )
+
+    def test_detail_expand(self):
+        res = self.client.get(detail_url(self.recipe.id), {"expand": ""})
+        self.assertEqual(res.data["tags"], [self.tag.id])
+
+        res = self.client.get(detail_url(self.recipe.id), {"fields": "tags"})
+        self.assertEqual(
+            res.data, {"tags": [{"id": self.tag.id, "name": self.tag.name}]}
+        )
+
+    def test_keyset_pages_with_deferred_ordering(self):
+        sample_recipe(user=self.user, title="other", price=2)
+        params = {"fields": "id", "ordering": "price", "page_size": 1}
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(res.data["next"])
+        self.assertEqual(res.data["results"], [{"id": self.recipe.id}])
+
+    def test_unknown_names(self):
+        for params in (
+            {"fields": "id,user"},
+            {"fields": "tag_names"},
+            {"expand": "title"},
+        ):
+            res = self.client.get(RECIPE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), res.data)
+
+
+class RecipeNamedRelationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            "title": "Choco",
+            "time_minutes": 5,
+            "price": "3.00",
+            "ingredients": [],
+        }
+
+    def test_create_with_names(self):
+        tag = sample_tag(user=self.user, name="Vegan")
+        payload = {
+            **self.payload,
+            "tag_names": ["Vegan", "Desert", "Desert"],
+            "ingredient_names": ["tea"],
+        }
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            ["Desert", "Vegan"],
+        )
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            list(recipe.ingredients.values_list("name", flat=True)), ["tea"]
+        )
+        self.assertNotIn("tag_names", res.data)
+
+    def test_relations_required_without_names(self):
+        payload = {"title": "Choco", "time_minutes": 5, "price": "3.00"}
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {"ingredients", "tags"})
+
+        payload = {**payload, "tag_names": ["Vegan"], "ingredients": []}
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        del payload["tag_names"]
+        res = self.client.put(
+            detail_url(res.data["id"]), payload, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data), {"tags"})
+
+    def test_names_combined_with_ids(self):
+        tag = sample_tag(user=self.user, name="Vegan")
+        payload = {**self.payload, "tags": [tag.id], "tag_names": ["Desert"]}
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["tags"]), 2)
+
+    def test_update_with_names_replaces_relation(self):
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+        res = self.client.patch(
+            detail_url(recipe.id), {"tag_names": ["curry"]}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(recipe.tags.values_list("name", flat=True)), ["curry"]
+        )
+
+    def test_update_with_names_and_ids(self):
+        recipe = sample_recipe(user=self.user)
+        kept = sample_tag(user=self.user, name="Vegan")
+        recipe.tags.add(sample_tag(user=self.user))
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"tags": [kept.id], "tag_names": ["curry"]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list("name", flat=True)),
+            {"Vegan", "curry"},
+        )
+
+    def test_names_not_shared_between_users(self):
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        other_tag = sample_tag(user=other, name="Vegan")
+        payload = {**self.payload, "tag_names": ["Vegan"]}
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertNotIn(other_tag.id, res.data["tags"])
+
+    def test_get_or_create_names(self):
+        sample_tag(user=self.user, name="Vegan")
+        found, created = Tag.objects.get_or_create_names(
+            self.user, ["Vegan", "Desert"]
+        )
+        self.assertEqual(set(found), {"Vegan", "Desert"})
+        self.assertEqual([tag.name for tag in created], ["Desert"])
+
+    def test_get_or_create_names_skips_concurrent_rows(self):
+        insert_new = NamedQuerySet._insert_new
+
+        def concurrent_insert(queryset, objs):
+            # another request commits the same name between the lookup
+            # and the insert
+            self.raced = sample_tag(user=self.user, name="Desert")
+            return insert_new(queryset, objs)
+
+        with patch.object(NamedQuerySet, "_insert_new", concurrent_insert):
+            found, created = Tag.objects.get_or_create_names(
+                self.user, ["Desert"]
+            )
+        self.assertEqual(created, [])
+        self.assertEqual(found["Desert"].id, self.raced.id)
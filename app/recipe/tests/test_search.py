@@ -0,0 +1,171 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+RECIPE_BULK_URL = reverse("recipe:recipe-bulk")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+
+def sample_recipe(user, **params):
+    defaults = {"title": "sample recipe", "time_minutes": 10, "price": 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, term):
+        res = self.client.get(RECIPES_URL, {"search": term})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["id"] for recipe in res.data]
+
+    def test_search_by_title(self):
+        soup = sample_recipe(self.user, title="Tomato soup")
+        sample_recipe(self.user, title="Fried chicken")
+
+        self.assertEqual(self.search("soups"), [soup.id])
+
+    def test_search_by_tag_and_ingredient_names(self):
+        recipe = sample_recipe(self.user, title="Dinner")
+        sample_recipe(self.user, title="Breakfast")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Lentils")
+        )
+
+        self.assertEqual(self.search("vegan"), [recipe.id])
+        self.assertEqual(self.search("lentil"), [recipe.id])
+
+    def test_write_rebuilds_vector_once(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Lentils")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(
+                RECIPES_URL,
+                {
+                    "title": "Dinner",
+                    "time_minutes": 5,
+                    "price": 5,
+                    "tags": [tag.id],
+                    "ingredients": [ingredient.id],
+                },
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        rebuilds = [
+            q for q in ctx.captured_queries if "search_vector =" in q["sql"]
+        ]
+        self.assertEqual(len(rebuilds), 1)
+        self.assertEqual(self.search("lentil"), [res.data["id"]])
+
+    def test_title_match_ranks_first(self):
+        tagged = sample_recipe(self.user, title="Stew")
+        tagged.tags.add(Tag.objects.create(user=self.user, name="Curry"))
+        titled = sample_recipe(self.user, title="Curry")
+
+        self.assertEqual(self.search("curry"), [titled.id, tagged.id])
+
+    def test_search_is_limited_to_user(self):
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        sample_recipe(other, title="Tomato soup")
+
+        self.assertEqual(self.search("soup"), [])
+
+    def test_tag_rename_updates_vector(self):
+        recipe = sample_recipe(self.user, title="Dinner")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+
+        tag.name = "Spicy"
+        tag.save()
+
+        self.assertEqual(self.search("vegan"), [])
+        self.assertEqual(self.search("spicy"), [recipe.id])
+
+    def test_tag_delete_updates_vector(self):
+        recipe = sample_recipe(self.user, title="Dinner")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+
+        tag.delete()
+
+        self.assertEqual(self.search("vegan"), [])
+
+    def test_bulk_created_recipes_are_searchable(self):
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        payload = [
+            {
+                "title": f"Soup {i}",
+                "time_minutes": 5,
+                "price": "10.00",
+                "tags": [tag.id],
+            }
+            for i in range(2)
+        ]
+        res = self.client.post(RECIPE_BULK_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(self.search("vegan soup")), 2)
+
+    def test_search_paginates_by_rank(self):
+        for i in range(3):
+            sample_recipe(self.user, title=f"Soup {i}")
+
+        res = self.client.get(RECIPES_URL, {"search": "soup", "page_size": 2})
+        self.assertEqual(len(res.data["results"]), 2)
+        res = self.client.get(res.data["next"])
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIsNone(res.data["next"])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, url, term):
+        res = self.client.get(url, {"search": term})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [obj["name"] for obj in res.data]
+
+    def test_prefix_match(self):
+        Tag.objects.create(user=self.user, name="Breakfast")
+        Tag.objects.create(user=self.user, name="Dinner")
+
+        self.assertEqual(self.search(TAGS_URL, "br"), ["Breakfast"])
+
+    def test_fuzzy_match(self):
+        Ingredient.objects.create(user=self.user, name="tomato")
+        Ingredient.objects.create(user=self.user, name="salt")
+
+        self.assertEqual(self.search(INGREDIENTS_URL, "tomatto"), ["tomato"])
+
+    def test_closest_match_first(self):
+        Ingredient.objects.create(user=self.user, name="tomato sauce")
+        Ingredient.objects.create(user=self.user, name="tomato")
+
+        self.assertEqual(
+            self.search(INGREDIENTS_URL, "tomato"),
+            ["tomato", "tomato sauce"],
+        )
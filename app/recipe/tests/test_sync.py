@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+SYNC_URL = reverse("recipe:sync")
+
+
+@override_settings(
+    SYNC={"page_size": 500, "max_page_size": 500, "commit_window": 0}
+)
+class SyncApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="vegan")
+        self.ingredient = Ingredient.objects.create(user=self.user, name="tea")
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=5, price=5
+        )
+        self.recipe.tags.add(self.tag)
+
+    def sync(self, cursor=None, **params):
+        if cursor is not None:
+            params["since"] = cursor
+        res = self.client.get(SYNC_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def ids(self, data, key):
+        return [item["id"] for item in data[key]]
+
+    def test_first_sync_returns_everything(self):
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="secret"
+        )
+        Tag.objects.create(user=other, name="other")
+        Tag.objects.create(user=self.user, name="gone").delete()
+
+        data = self.sync()
+        self.assertEqual(self.ids(data, "tags"), [self.tag.id])
+        self.assertEqual(self.ids(data, "ingredients"), [self.ingredient.id])
+        self.assertEqual(data["recipes"][0]["tags"], [self.tag.id])
+        self.assertEqual(data["deleted"]["tags"], [])
+        self.assertFalse(data["has_more"])
+
+    def test_only_changes_since_cursor(self):
+        cursor = self.sync()["cursor"]
+        self.assertEqual(self.ids(self.sync(cursor), "tags"), [])
+
+        new_tag = Tag.objects.create(user=self.user, name="quick")
+        self.recipe.title = "asd"
+        self.recipe.save()
+        self.ingredient.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(self.ids(data, "tags"), [new_tag.id])
+        self.assertEqual(data["recipes"][0]["title"], "asd")
+        self.assertEqual(data["ingredients"], [])
+        self.assertEqual(data["deleted"]["ingredients"], [self.ingredient.id])
+
+    def test_link_changes_are_recipe_changes(self):
+        cursor = self.sync()["cursor"]
+        self.tag.delete()
+        data = self.sync(cursor)
+        self.assertEqual(data["deleted"]["tags"], [self.tag.id])
+        self.assertEqual(data["recipes"][0]["tags"], [])
+
+    def test_pages(self):
+        for i in range(3):
+            Tag.objects.create(user=self.user, name=f"tag {i}")
+        names = []
+        cursor = None
+        while True:
+            data = self.sync(cursor, page_size=2)
+            names.extend(item["name"] for item in data["tags"])
+            cursor = data["cursor"]
+            if not data["has_more"]:
+                break
+        self.assertEqual(names, ["vegan", "tag 0", "tag 1", "tag 2"])
+
+    @override_settings(
+        SYNC={"page_size": 500, "max_page_size": 500, "commit_window": 60}
+    )
+    def test_recent_changes_sent_again(self):
+        Tag.objects.filter(pk=self.tag.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+        cursor = self.sync()["cursor"]
+        data = self.sync(cursor)
+        self.assertEqual(self.ids(data, "tags"), [])
+        self.assertEqual(self.ids(data, "recipes"), [self.recipe.id])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(SYNC_URL, {"since": "qwe"})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="secret"
+        )
+
+    def test_tombstone_kept(self):
+        tag = Tag.objects.create(user=self.user, name="vegan")
+        recipe = Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=5, price=5
+        )
+        recipe.tags.add(tag)
+        Tag.objects.filter(pk=tag.pk).delete()
+
+        self.assertFalse(Tag.objects.exists())
+        self.assertIsNotNone(Tag.all_objects.get().deleted_at)
+        self.assertFalse(recipe.tags.exists())
+        # names of deleted tags can be taken again
+        Tag.objects.create(user=self.user, name="vegan")
+
+    def test_user_delete_removes_rows(self):
+        Recipe.objects.create(
+            user=self.user, title="qwe", time_minutes=5, price=5
+        )
+        self.user.delete()
+        self.assertFalse(Recipe.all_objects.exists())
@@ -3,6 +3,7 @@ from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework.utils.urls import replace_query_param
 from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
@@ -70,6 +71,20 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.post(TAGS_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_tag_duplicate_name(self):
+        Tag.objects.create(user=self.user, name="testtag")
+        res = self.client.post(TAGS_URL, {"name": "testtag"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.data)
+
+    def test_same_name_for_other_user(self):
+        other = get_user_model().objects.create_user(
+            email="other@test.ru", password="password"
+        )
+        Tag.objects.create(user=other, name="testtag")
+        res = self.client.post(TAGS_URL, {"name": "testtag"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
     def test_retrieve_tags_assigned_to_recipe(self):
         tag1 = Tag.objects.create(user=self.user, name="qwe")
         tag2 = Tag.objects.create(user=self.user, name="qwe2")
@@ -96,3 +111,83 @@ class PrivateTagsApiTests(TestCase):
         recipe2.tags.add(tag1)
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
         self.assertEqual(len(res.data), 1)
+
+
+class TagUsageCountTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@test.ru", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.popular = Tag.objects.create(user=self.user, name="popular")
+        self.rare = Tag.objects.create(user=self.user, name="rare")
+        self.unused = Tag.objects.create(user=self.user, name="unused")
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"r{i}", time_minutes=5, price=5
+            )
+            recipe.tags.add(self.popular)
+        recipe.tags.add(self.rare)
+
+    def test_with_counts(self):
+        res = self.client.get(TAGS_URL, {"with_counts": 1})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {item["name"]: item["recipe_count"] for item in res.data}
+        self.assertEqual(counts, {"popular": 2, "rare": 1, "unused": 0})
+
+        res = self.client.get(TAGS_URL)
+        self.assertNotIn("recipe_count", res.data[0])
+
+    def test_with_counts_flag_values(self):
+        res = self.client.get(TAGS_URL, {"with_counts": "true"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("recipe_count", res.data[0])
+
+        res = self.client.get(TAGS_URL, {"with_counts": "false"})
+        self.assertNotIn("recipe_count", res.data[0])
+
+        for value in ("maybe", ""):
+            res = self.client.get(TAGS_URL, {"with_counts": value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("with_counts", res.data)
+
+    def test_order_by_popularity(self):
+        params = {"with_counts": 1, "ordering": "-recipe_count"}
+        res = self.client.get(TAGS_URL, params)
+        names = [item["name"] for item in res.data]
+        self.assertEqual(names, ["popular", "rare", "unused"])
+
+    def test_counts_with_assigned_only(self):
+        params = {
+            "with_counts": 1,
+            "assigned_only": 1,
+            "ordering": "recipe_count",
+        }
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, params)
+        self.assertEqual(
+            [(item["name"], item["recipe_count"]) for item in res.data],
+            [("rare", 1), ("popular", 2)],
+        )
+
+    def test_popularity_pages(self):
+        params = {"ordering": "-recipe_count", "page_size": 1}
+        names = []
+        res = self.client.get(TAGS_URL, params)
+        while True:
+            names.extend(item["name"] for item in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+        self.assertEqual(names, ["popular", "rare", "unused"])
+
+    def test_popularity_cursor_not_reused_by_name(self):
+        params = {"ordering": "-recipe_count", "page_size": 1}
+        next_url = self.client.get(TAGS_URL, params).data["next"]
+        res = self.client.get(replace_query_param(next_url, "ordering", ""))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_ordering(self):
+        res = self.client.get(TAGS_URL, {"ordering": "user"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -8,4 +8,8 @@ router.register("tags", views.TagViewSet)
 router.register("ingredients", views.IngredientViewSet)
 router.register("recipes", views.RecipeViewSet)
 app_name = "recipe"
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("stats/", views.StatsView.as_view(), name="stats"),
+    path("sync/", views.SyncView.as_view(), name="sync"),
+    path("", include(router.urls)),
+]
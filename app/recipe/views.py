@@ -1,36 +1,145 @@
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+)
+from django.db.models.functions import Cast
+from django.db.models.query import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    quote_etag,
+)
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy as _
+from rest_framework import fields, generics, viewsets, mixins, status
+from core.authentication import CachedTokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from core.models import Tag, Ingredient, Recipe
+from core.search import SEARCH_CONFIG
+from core.stats import get_user_stats
+from core.tasks import run_in_background
 from recipe import serializers
+from recipe.export import EXPORT_FORMATS, iter_chunks
+from recipe.images import RENDITIONS, process_recipe_image
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from recipe.mixins import BulkMixin, CachedListMixin, OrderingMixin
+from recipe.pagination import KeysetPagination
+from recipe.sync import build_sync, decode_cursor
 
 
 class BaseRecipeAttrViewSet(
-    viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin
+    CachedListMixin,
+    BulkMixin,
+    OrderingMixin,
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
 ):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    ordering_fields = ("name", "recipe_count")
 
     def get_queryset(self):
         """ Return objects for current authed users """
-        assigne_only = bool(
-            int(self.request.query_params.get("assigned_only", 0))
-        )
-        queryset = self.queryset
+        assigne_only = self.get_flag("assigned_only")
+        ordering = self.get_ordering()
+        queryset = self.queryset.filter(user=self.request.user)
         if assigne_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.annotate(
+                assigned=Exists(self.get_recipe_links())
+            ).filter(assigned=True)
 
-        return (
-            queryset.filter(user=self.request.user)
-            .order_by("-name")
-            .distinct()
-        )
+        search = self.request.query_params.get("search")
+        if search:
+            # prefix matches and typo tolerant matches for autocomplete,
+            # both served by the trigram indexes on name
+            return (
+                queryset.filter(
+                    Q(name__istartswith=search)
+                    | Q(name__trigram_similar=search)
+                )
+                .annotate(
+                    similarity=Cast(
+                        TrigramSimilarity("name", search), FloatField()
+                    )
+                )
+                .order_by(*(ordering or ("-similarity", "-id")))
+            )
+        return queryset.order_by(*(ordering or ("-name", "-id")))
+
+    def get_serializer(self, *args, **kwargs):
+        # recipe_count is a stored counter, showing it costs no queries
+        kwargs.setdefault("with_counts", self.get_flag("with_counts"))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_flag(self, param):
+        """ Return boolean query param, False when it is absent """
+        value = self.request.query_params.get(param)
+        if value is None:
+            return False
+        try:
+            return fields.BooleanField().to_internal_value(value)
+        except ValidationError as exc:
+            raise ValidationError({param: exc.detail})
+
+    def get_recipe_links(self):
+        """ Return recipe m2m rows pointing to the outer object """
+        field = Recipe._meta.get_field(self.recipe_field)
+        through = field.remote_field.through
+        model_name = self.queryset.model._meta.model_name
+        return through.objects.filter(**{model_name: OuterRef("pk")})
 
     def perform_create(self, serializer):
         """ Creates new tag """
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            # a concurrent request took the name after validation
+            raise ValidationError({"name": [serializers.DUPLICATE_NAME]})
+
+    def validate_bulk_items(self, item_serializers):
+        """ Also rejects names repeated within one bulk request or taken
+        by other objects, checked for all items with one query """
+        data, errors = super().validate_bulk_items(item_serializers)
+        names = [
+            values.get("name") if values is not None else None
+            for values in data
+        ]
+        taken = dict(
+            self.get_bulk_queryset()
+            .filter(name__in={name for name in names if name is not None})
+            .values_list("name", "id")
+        )
+        seen = set()
+        for name, serializer, item_errors in zip(
+            names, item_serializers, errors
+        ):
+            if name is None:
+                continue
+            own_id = getattr(serializer.instance, "pk", None)
+            if name in seen or taken.get(name, own_id) != own_id:
+                item_errors["name"] = [serializers.DUPLICATE_NAME]
+            seen.add(name)
+        return data, errors
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -38,6 +147,7 @@ class TagViewSet(BaseRecipeAttrViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_field = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -45,15 +155,36 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_field = "ingredients"
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    CachedListMixin, BulkMixin, OrderingMixin, viewsets.ModelViewSet
+):
     """ Manage Tags in th database """
 
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
-    authentication_classes = (TokenAuthentication,)
+    bulk_serializer_class = serializers.RecipeBulkSerializer
+    export_chunk_size = 500
+    ordering_fields = ("title", "price", "time_minutes")
+    range_filters = (
+        (
+            "price_min",
+            "price__gte",
+            fields.DecimalField(max_digits=None, decimal_places=None),
+        ),
+        (
+            "price_max",
+            "price__lte",
+            fields.DecimalField(max_digits=None, decimal_places=None),
+        ),
+        ("time_max", "time_minutes__lte", fields.IntegerField()),
+    )
+    sparse_actions = ("list", "retrieve")
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def _params_to_ints(self, qs):
         return [int(str_id) for str_id in qs.split(",")]
@@ -62,14 +193,204 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """ Return objects for current authed users """
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
+        match_all = self.request.query_params.get("match") == "all"
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(
+                id__in=self._linked_recipe_ids("tags", tag_ids, match_all)
+            )
         if ingredients:
             ing_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ing_ids)
-        return queryset.filter(user=self.request.user).order_by("-title")
+            queryset = queryset.filter(
+                id__in=self._linked_recipe_ids(
+                    "ingredients", ing_ids, match_all
+                )
+            )
+        queryset = queryset.filter(
+            user=self.request.user, **self.get_range_filters()
+        )
+        ordering = self.get_ordering()
+        search = self.request.query_params.get("search")
+        if search:
+            query = SearchQuery(search, config=SEARCH_CONFIG)
+            queryset = (
+                queryset.filter(search_vector=query)
+                # ts_rank returns real, cast so cursor values read back
+                # from a page compare equal to the stored rank
+                .annotate(
+                    rank=Cast(
+                        SearchRank(F("search_vector"), query), FloatField()
+                    )
+                )
+                .order_by(*(ordering or ("-rank", "-id")))
+            )
+        else:
+            queryset = queryset.order_by(*(ordering or ("-title", "-id")))
+        if self.action in self.sparse_actions:
+            queryset = queryset.only(*self.get_columns(queryset))
+        if self.action in ("update", "partial_update"):
+            # If-Match is checked against the row the update writes
+            queryset = queryset.select_for_update()
+        if self.action == "retrieve":
+            # prefetched by retrieve once the recipe is known to be stale
+            return queryset
+        return queryset.prefetch_related(*self.get_prefetches())
+
+    def get_range_filters(self):
+        """ Return lookups for price and time range query params """
+        lookups = {}
+        for param, lookup, field in self.range_filters:
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                lookups[lookup] = field.to_internal_value(value)
+            except ValidationError as exc:
+                raise ValidationError({param: exc.detail})
+        return lookups
+
+    def _linked_recipe_ids(self, field_name, ids, match_all=False):
+        """ Return subquery of recipe ids linked to any or all of ids """
+        field = Recipe._meta.get_field(field_name)
+        target = field.m2m_reverse_field_name()
+        links = field.remote_field.through.objects.filter(
+            **{f"{target}__in": ids}
+        )
+        if match_all:
+            links = (
+                links.values("recipe")
+                .annotate(matched=Count(target))
+                .filter(matched=len(set(ids)))
+            )
+        return links.values("recipe")
+
+    def _params_to_names(self, param, choices):
+        """ Return names listed in a query param, None when it is absent """
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        names = tuple(name for name in value.split(",") if name)
+        unknown = set(names) - set(choices)
+        if unknown:
+            raise ValidationError(
+                {
+                    param: _("Unknown %s, use any of %s")
+                    % (", ".join(sorted(unknown)), ", ".join(choices))
+                }
+            )
+        return names
+
+    def get_fields(self):
+        """ Return serializer fields picked with ``fields=``, or all
+        readable ones """
+        serializer_class = self.get_serializer_class()
+        all_fields = tuple(
+            name
+            for name in serializer_class.Meta.fields
+            if name not in serializer_class.name_fields
+        )
+        return self._params_to_names("fields", all_fields) or all_fields
+
+    def get_expand(self):
+        """ Return relations to nest picked with ``expand=`` """
+        serializer_class = self.get_serializer_class()
+        expand = self._params_to_names(
+            "expand", tuple(serializer_class.expandable_fields)
+        )
+        return serializer_class.default_expand if expand is None else expand
+
+    def get_columns(self, queryset):
+        """ Return recipe columns read by the serializer and the ordering
+
+        Ordering values are read back from the last row of a page to
+        build the next cursor, deferring them would cost a query per page.
+        """
+        columns = {"id"}
+        if self.action == "retrieve":
+            columns.update(("version", "updated_at"))
+        names = (
+            *self.get_fields(),
+            *(field.lstrip("-") for field in queryset.query.order_by),
+        )
+        for name in names:
+            try:
+                field = Recipe._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(field.attname)
+        return columns
+
+    def get_prefetches(self):
+        """ Return m2m prefetches needed by the action serializer """
+        if self.action not in self.sparse_actions:
+            return ()
+        selected = self.get_fields()
+        expand = self.get_expand()
+        prefetches = []
+        for field in Recipe._meta.many_to_many:
+            if field.name not in selected:
+                continue
+            if field.name not in expand:
+                related = field.related_model.objects.only("id")
+                prefetches.append(Prefetch(field.name, related))
+            else:
+                prefetches.append(field.name)
+        return prefetches
+
+    def get_conditional_response(self, recipe):
+        """ Return a 304 or 412 response when the request's conditional
+        headers match or fail against the stored recipe, else None """
+        return get_conditional_response(
+            self.request,
+            etag=self.get_etag(recipe),
+            last_modified=int(recipe.updated_at.timestamp()),
+        )
+
+    def get_etag(self, recipe):
+        return quote_etag(f"{recipe.pk}-{recipe.version}")
+
+    def set_validators(self, response, recipe):
+        """ Add ETag and Last-Modified of recipe, responses differ by
+        user and may only be reused after revalidation """
+        response["ETag"] = self.get_etag(recipe)
+        response["Last-Modified"] = http_date(recipe.updated_at.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Answers If-None-Match and If-Modified-Since from the recipe
+        row before tags and ingredients are loaded """
+        instance = self.get_object()
+        response = self.get_conditional_response(instance)
+        if response is None:
+            prefetch_related_objects([instance], *self.get_prefetches())
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        return self.set_validators(response, instance)
+
+    def update(self, request, *args, **kwargs):
+        """ Updates the recipe unless If-Match names an older version """
+        partial = kwargs.pop("partial", False)
+        with transaction.atomic():
+            instance = self.get_object()
+            response = self.get_conditional_response(instance)
+            if response is not None:
+                return self.set_validators(response, instance)
+            serializer = self.get_serializer(
+                instance, data=request.data, partial=partial
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        return self.set_validators(Response(serializer.data), instance)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.sparse_actions:
+            kwargs.setdefault("fields", self.get_fields())
+            kwargs.setdefault("expand", self.get_expand())
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         """ Creates new recipe """
@@ -87,6 +408,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=req.data)
         if serializer.is_valid():
-            serializer.save()
+            stale_files = [
+                getattr(recipe, field).name
+                for field in ("image", *RENDITIONS)
+                if getattr(recipe, field)
+            ]
+            # renditions are rebuilt by a worker, the original is served
+            # as soon as it is stored
+            serializer.save(**{field: None for field in RENDITIONS})
+            run_in_background(process_recipe_image, recipe.id, stale_files)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["get"], detail=False, url_path="export")
+    def export(self, req):
+        """ Streams user's recipes with tags and ingredients """
+        export_type = req.query_params.get("type", "ndjson")
+        if export_type not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"type": _("Unknown export type, use ndjson or csv")}
+            )
+        lines, content_type = EXPORT_FORMATS[export_type]
+        chunks = iter_chunks(self.get_queryset(), self.export_chunk_size)
+        response = StreamingHttpResponse(
+            lines(chunks), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{export_type}"'
+        )
+        return response
+
+
+class StatsView(generics.RetrieveAPIView):
+    """ Summary of the user's recipes, tags and ingredients """
+
+    serializer_class = serializers.UserStatsSerializer
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_object(self):
+        return get_user_stats(self.request.user.pk)
+
+
+class SyncView(generics.GenericAPIView):
+    """ Changes of the user's tags, ingredients and recipes since the
+    ``since`` cursor of an earlier sync, deleted ones as ids """
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        positions = decode_cursor(since) if since else {}
+        data = build_sync(
+            request.user,
+            positions,
+            self.get_page_size(),
+            self.get_serializer_context(),
+        )
+        return Response(data)
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.query_params["page_size"])
+        except (KeyError, ValueError):
+            return settings.SYNC["page_size"]
+        if size <= 0:
+            return settings.SYNC["page_size"]
+        return min(size, settings.SYNC["max_page_size"])
@@ -2,8 +2,11 @@ from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from django.utils.translation import ugettext_lazy as _
 
+from core.authentication import credential_limiter
+from core.serializers import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Users"""
 
     class Meta:
@@ -38,11 +41,13 @@ class AuthTokenSerializer(serializers.Serializer):
     def validate(self, attrs):
         email = attrs.get("email")
         password = attrs.get("password")
-        user = authenticate(
-            request=self.context.get("request"),
-            username=email,
-            password=password,
-        )
+        # hashing the password is the expensive part of a login
+        with credential_limiter.slot():
+            user = authenticate(
+                request=self.context.get("request"),
+                username=email,
+                password=password,
+            )
         if not user:
             msg = _("Unable to auth with provided creds")
             raise serializers.ValidationError(msg, code="authentication")
@@ -1,9 +1,16 @@
+from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import (
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from core.authentication import ConcurrencyLimiter
 
 
 CREATE_USER_URL = reverse("user:create")
@@ -62,6 +69,42 @@ class PublicUserApiTests(TestCase):
         self.assertIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_each_login_issues_new_token(self):
+        """ Tests that tokens are rotated and older sessions stay valid """
+        payload = {"email": "test@test.com", "password": "secret"}
+        user = create_user(**payload)
+        first = self.client.post(TOKEN_URL, payload).data["token"]
+        second = self.client.post(TOKEN_URL, payload).data["token"]
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            set(user.auth_tokens.values_list("key", flat=True)),
+            {first, second},
+        )
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """ Tests that PBKDF2 hashes are rehashed with preferred hasher """
+        user = create_user(email="test@test.com", password="secret")
+        user.password = make_password("secret", hasher="pbkdf2_sha256")
+        user.save()
+        payload = {"email": "test@test.com", "password": "secret"}
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(
+            identify_hasher(user.password).algorithm, get_hasher().algorithm
+        )
+
+    def test_create_token_busy(self):
+        """ Tests that login waiting too long for a check slot gets 503 """
+        create_user(email="test@test.com", password="secret")
+        payload = {"email": "test@test.com", "password": "secret"}
+        limiter = ConcurrencyLimiter(max_concurrent=1, timeout=0.01)
+        with patch("user.serializers.credential_limiter", limiter):
+            with limiter.slot():
+                res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertNotIn("token", res.data)
+
     def test_create_token_invalid_credentials(self):
         """ Test that token is not created if invalid cred are given """
         create_user(
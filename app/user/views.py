@@ -1,7 +1,10 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from core.models import AuthToken
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
@@ -17,12 +20,24 @@ class AuthTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """ Issues a fresh token on every login, tokens of other sessions
+        stay valid until they expire """
+        serializer = self.serializer_class(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        token = AuthToken.objects.create(
+            user=serializer.validated_data["user"]
+        )
+        return Response({"token": token.key})
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage use profile update name and password"""
 
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):